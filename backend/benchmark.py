@@ -0,0 +1,249 @@
+"""Offline benchmark / load test of the query API — no Gemini, optionally no database.
+
+Drives the FastAPI app in-process (httpx ASGI transport) at a fixed
+concurrency, with a fake genai client in place of Gemini:
+  - embeddings are deterministic (hashed word features), so similar
+    questions land near each other and retrieval behaves sensibly;
+  - generation waits a fixed latency plus answer_tokens / tokens_per_sec,
+    streaming tokens at that rate for /query/stream.
+
+Retrieval runs against either
+  - an in-memory stand-in for match_documents: a synthetic corpus written to
+    a temporary snapshot and served by the local index (default), or
+  - a local pgvector Postgres loaded with scripts/setup_neon.sql (--database-url).
+
+Reports throughput and p50/p95/p99 per pipeline stage, taken from each
+response's Server-Timing header (/query) or final `done` event (/query/stream).
+
+Usage:
+    python benchmark.py
+    python benchmark.py --requests 500 --concurrency 50 --distinct 100
+    python benchmark.py --endpoint stream --generate-ms 300 --tokens-per-sec 80
+    python benchmark.py --database-url postgresql://postgres@localhost/vedan
+"""
+import os, sys, io, json, time, asyncio, argparse, hashlib, random, tempfile, contextlib
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+EMBED_DIM = 768
+TOPICS = [
+    "input tax credit", "registration", "e-way bill", "composition levy", "refund of tax",
+    "tax invoice", "return filing", "time of supply", "place of supply", "reverse charge",
+    "job work", "tax deducted at source", "casual taxable person", "advance ruling", "penalty",
+]
+
+
+# ── Fake Gemini ─────────────────────────────────────────────────
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> list[float]:
+    """Deterministic bag-of-words embedding: each word adds a hashed +/-1 feature."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        digest = hashlib.blake2b(word.strip("?.,:;()").encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeModels:
+    def __init__(self, embed_ms, generate_ms, tokens_per_sec, answer_tokens):
+        self.embed_ms = embed_ms
+        self.generate_ms = generate_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.embed_calls = 0
+        self.generate_calls = 0
+
+    def _usage(self, prompt):
+        return SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=self.answer_tokens)
+
+    async def embed_content(self, model, contents, config=None):
+        self.embed_calls += 1
+        texts = contents if isinstance(contents, list) else [contents]
+        await asyncio.sleep(self.embed_ms / 1000)
+        dim = (config or {}).get("output_dimensionality", EMBED_DIM)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_embedding(t, dim)) for t in texts])
+
+    async def generate_content(self, model, contents):
+        self.generate_calls += 1
+        await asyncio.sleep(self.generate_ms / 1000 + self.answer_tokens / self.tokens_per_sec)
+        return SimpleNamespace(text="word " * self.answer_tokens, usage_metadata=self._usage(contents))
+
+    async def generate_content_stream(self, model, contents):
+        self.generate_calls += 1
+        usage = self._usage(contents)
+
+        async def chunks():
+            await asyncio.sleep(self.generate_ms / 1000)
+            per_chunk = 10
+            for sent in range(0, self.answer_tokens, per_chunk):
+                n = min(per_chunk, self.answer_tokens - sent)
+                await asyncio.sleep(n / self.tokens_per_sec)
+                yield SimpleNamespace(text="word " * n, usage_metadata=usage)
+
+        return chunks()
+
+
+# ── Synthetic corpus (in-memory match_documents stand-in) ───────
+
+def build_corpus(path: str, size: int, seed: int = 7):
+    from src.rag.snapshot import write_snapshot
+
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        notification = f"{i % 80 + 1}/2017 - Central Tax"
+        body = " ".join(
+            [f"This chunk explains {topic} under the CGST Act."]
+            + [rng.choice(TOPICS) for _ in range(40)]
+        )
+        content = f"Document: Notification on {topic}\nNotification: {notification}\n\n{body}"
+        chunks.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "document_id": f"doc-{i % 80}",
+            "chunk_index": i // 80,
+            "total_chunks": size // 80 + 1,
+            "section_number": str(i % 170 + 1),
+            "page_numbers": [i % 12 + 1],
+            "tokens": len(content) // 4,
+            "content": content,
+            "embedding": fake_embedding(content),
+        })
+    write_snapshot(path, chunks, embed_model="fake-embedding")
+
+
+def make_questions(distinct: int, seed: int = 11) -> list[str]:
+    rng = random.Random(seed)
+    templates = [
+        "What are the rules for {} ?", "How does {} work for a registered person?",
+        "Explain {} under GST", "When is {} applicable?", "What is the time limit for {}?",
+    ]
+    return [rng.choice(templates).format(rng.choice(TOPICS)) + f" (case {i})" for i in range(distinct)]
+
+
+# ── Load generation ─────────────────────────────────────────────
+
+def parse_server_timing(header: str) -> dict:
+    stages = {}
+    for part in filter(None, (p.strip() for p in header.split(","))):
+        name, _, dur = part.partition(";dur=")
+        if dur:
+            stages[name] = float(dur)
+    return stages
+
+
+def parse_stream_timings(body: str) -> dict:
+    event = None
+    for line in body.splitlines():
+        if line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data: ") and event == "done":
+            timings = json.loads(line[6:])["timings"]
+            return {k[:-3]: v for k, v in timings.items() if k.endswith("_ms")}
+    return {}
+
+
+async def run_load(app, questions, requests, concurrency, endpoint, k):
+    import httpx
+
+    samples, errors = [], 0
+    counter = iter(range(requests))
+    path = "/query/stream" if endpoint == "stream" else "/query"
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            payload = {"question": questions[i % len(questions)], "k": k}
+            start = time.perf_counter()
+            response = await client.post(path, json=payload)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if response.status_code != 200 or "event: error" in response.text:
+                errors += 1
+                continue
+            if endpoint == "stream":
+                stages = parse_stream_timings(response.text)
+            else:
+                stages = parse_server_timing(response.headers.get("server-timing", ""))
+            stages["client_total"] = elapsed_ms
+            samples.append(stages)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return samples, errors, wall
+
+
+def report(samples, errors, wall, models, args):
+    print("=" * 72)
+    print(f"{args.requests} requests to /{'query/stream' if args.endpoint == 'stream' else 'query'}, "
+          f"concurrency {args.concurrency}, {args.distinct} distinct questions")
+    print(f"Throughput: {len(samples) / wall:.1f} req/s over {wall:.2f}s  ({errors} errors)")
+    print(f"Gemini calls: {models.embed_calls} embed, {models.generate_calls} generate")
+    print("-" * 72)
+    print(f"{'stage':<16}{'n':>7}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    stages = sorted({name for sample in samples for name in sample}, key=lambda s: (s == "client_total", s == "total", s))
+    for stage in stages:
+        values = np.array([sample[stage] for sample in samples if stage in sample])
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"{stage:<16}{len(values):>7}{p50:>12.1f}{p95:>12.1f}{p99:>12.1f}{values.max():>12.1f}")
+    print("=" * 72)
+
+
+async def main(args):
+    os.environ["GOOGLE_API_KEY"] = "benchmark"
+    if args.no_cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+        os.environ["EMBED_CACHE_SIZE"] = "0"
+
+    workdir = tempfile.TemporaryDirectory(prefix="vedan-bench-")
+    if args.database_url:
+        os.environ["RETRIEVAL_BACKEND"] = "neon"
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        snapshot = os.path.join(workdir.name, "corpus.snapshot")
+        print(f"Building a {args.corpus_size}-chunk synthetic corpus...", flush=True)
+        build_corpus(snapshot, args.corpus_size)
+        os.environ["RETRIEVAL_BACKEND"] = "local"
+        os.environ["LOCAL_INDEX_PATH"] = snapshot
+        os.environ.pop("DATABASE_URL", None)
+
+    from src.api import main as api
+
+    models = FakeModels(args.embed_ms, args.generate_ms, args.tokens_per_sec, args.answer_tokens)
+    logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with logs:
+        engine = await api.get_engine()
+        engine.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        questions = make_questions(args.distinct)
+        samples, errors, wall = await run_load(
+            api.app, questions, args.requests, args.concurrency, args.endpoint, args.k
+        )
+        await api.close_engine()
+
+    report(samples, errors, wall, models, args)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests in flight at once")
+    parser.add_argument("--distinct", type=int, default=200, help="Distinct questions (fewer = more cache hits)")
+    parser.add_argument("--endpoint", choices=("query", "stream"), default="query")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--embed-ms", type=float, default=80, help="Fake embed_content latency")
+    parser.add_argument("--generate-ms", type=float, default=400, help="Fake generation latency before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=150, help="Fake generation output rate")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="Tokens per fake answer")
+    parser.add_argument("--corpus-size", type=int, default=5000, help="Chunks in the synthetic corpus")
+    parser.add_argument("--database-url", help="Search a local pgvector Postgres instead of the in-memory corpus")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the embedding and answer caches")
+    parser.add_argument("--verbose", action="store_true", help="Keep the engine's request logs")
+    asyncio.run(main(parser.parse_args()))
@@ -3,19 +3,29 @@ import os
 # Ensure we can import from src
 sys.path.insert(0, os.getcwd()) 
 
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
 from src.rag.neon_query_engine import NeonRAGEngine
 
-print("Starting debug script...", flush=True)
-try:
+
+async def main():
     print("Initializing Engine...", flush=True)
     engine = NeonRAGEngine()
-    print("Engine initialized. Running query...", flush=True)
-    result = engine.query("What is GST?")
-    print("Query success!")
-    print(result)
+    await engine.open()
+    try:
+        print("Engine initialized. Running query...", flush=True)
+        result = await engine.query("What is GST?")
+        print("Query success!")
+        print(result)
+    finally:
+        await engine.close()
+
+
+print("Starting debug script...", flush=True)
+try:
+    asyncio.run(main())
 except Exception as e:
     print("\nERROR OCCURRED:", flush=True)
     import traceback
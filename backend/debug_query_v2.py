@@ -1,5 +1,6 @@
 import sys
 import os
+import asyncio
 import requests
 import traceback
 from dotenv import load_dotenv
@@ -47,8 +48,14 @@ try:
 
     # 2. Test Full RAG Engine
     print("\n--- Testing Full RAG Engine ---", flush=True)
-    engine = SupabaseRAGEngine()
-    result = engine.query("test")
+    async def run_engine():
+        engine = SupabaseRAGEngine()
+        try:
+            return await engine.query("test")
+        finally:
+            await engine.close()
+
+    result = asyncio.run(run_engine())
     print("RAG Engine Success!")
 
 except Exception:
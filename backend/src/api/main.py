@@ -1,13 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import os, sys, traceback
+from typing import Dict, List, Literal, Optional
+import os, sys, json, time, asyncio, importlib, traceback
 from dotenv import load_dotenv
 
 # Ensure the project root is on sys.path so we can import src.rag.*
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
+from src.rag import metrics
+
 load_dotenv()
 
 # ──────────────────────────────────────────────────────────────
@@ -28,12 +31,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Per-request stage timings in a Server-Timing header, plus request metrics.
+
+    Streaming responses only carry the stages finished before the first
+    byte; their full timings arrive in the stream's final event.
+    """
+    timings = metrics.start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    timings["total_ms"] = round(elapsed * 1000, 1)
+    response.headers["Server-Timing"] = metrics.server_timing(timings)
+
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.REQUEST_SECONDS.observe(elapsed, path=path)
+    metrics.REQUESTS.inc(path=path, status=response.status_code)
+    return response
+
+
 # ──────────────────────────────────────────────────────────────
 # Pydantic models
 # ──────────────────────────────────────────────────────────────
 class QueryRequest(BaseModel):
     question: str
     k: Optional[int] = Field(default=10, ge=1, le=20)
+    # "hybrid" fuses vector search with full-text matching, which helps
+    # questions quoting identifiers like "16/2017 - Central Tax"
+    retrieval: Literal["vector", "hybrid"] = "vector"
+    # Treat k as an upper bound and keep only the chunks scoring close to the best
+    adaptive_k: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    # One Gemini embed call covers the whole batch, which caps it at 100 texts
+    questions: List[str] = Field(min_length=1, max_length=100)
+    k: Optional[int] = Field(default=10, ge=1, le=20)
+    retrieval: Literal["vector", "hybrid"] = "vector"
+    adaptive_k: bool = False
 
 
 class Source(BaseModel):
@@ -48,6 +87,8 @@ class QueryResponse(BaseModel):
     question: str
     answer: str
     sources: List[Source]
+    # Chunks retrieved for the answer (below k when adaptive_k cut the list)
+    k_used: Optional[int] = None
 
 
 class HealthResponse(BaseModel):
@@ -56,31 +97,104 @@ class HealthResponse(BaseModel):
 
 
 class StatsResponse(BaseModel):
+    # Chunks in document_chunks; a planner estimate when `estimated` is true
     total_documents: int
     database: str
+    estimated: bool = False
+    # Chunk counts per document_id / tax_type / embed_model (absent with estimates)
+    by_document: Optional[Dict[str, int]] = None
+    by_tax_type: Optional[Dict[str, int]] = None
+    by_embed_model: Optional[Dict[str, int]] = None
+    corpus_version: Optional[int] = None
+    # Seconds since these counts were read (they are cached for STATS_TTL)
+    age_seconds: Optional[float] = None
+    # calls / executions / collapsed / in_flight for coalesced identical queries,
+    # and embed_batching counters for micro-batched question embeddings
+    coalescing: Optional[dict] = None
 
 
 # ──────────────────────────────────────────────────────────────
-# RAG engine (lazy-loaded on first request to avoid Render port timeout)
+# RAG engine (warmed up in the background after the port opens)
 # ──────────────────────────────────────────────────────────────
 rag_engine = None
+_warmup_task = None
+# state: idle -> warming -> ready | failed; timings per start-up component
+warmup = {"state": "idle", "error": None, "attempts": 0, "timings": {}}
+
 
+async def _build_engine():
+    """Import and open the RAG engine, timing each step into warmup["timings"].
 
-def get_engine():
-    """Lazy-load the RAG engine on first request.
-    
-    The import is deferred here because sentence-transformers / PyTorch
-    take minutes to import on Render's free tier, which would block
-    uvicorn from opening the port in time.
+    The import runs in a thread because sentence-transformers / PyTorch
+    take minutes to import on Render's free tier, which would otherwise
+    stall the event loop (and /livez) for the whole warmup.
     """
     global rag_engine
-    if rag_engine is None:
-        print("First request — importing heavy libraries...", flush=True)
-        from src.rag.neon_query_engine import NeonRAGEngine
+    timings = warmup["timings"] = {}
+    started = time.perf_counter()
+    try:
+        print("Importing heavy libraries...", flush=True)
+        start = time.perf_counter()
+        module = await asyncio.to_thread(importlib.import_module, "src.rag.neon_query_engine")
+        timings["import_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
         print("Initializing RAG engine...", flush=True)
-        rag_engine = NeonRAGEngine()
-        print("RAG engine ready!", flush=True)
-    return rag_engine
+        start = time.perf_counter()
+        engine = module.NeonRAGEngine()
+        timings["construct_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        await engine.open()
+        timings["open_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        timings.update(engine.init_timings)
+    except Exception as e:
+        warmup.update(state="failed", error=f"{type(e).__name__}: {e}")
+        print(f"RAG engine warmup FAILED: {warmup['error']}", flush=True)
+        raise
+    finally:
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    rag_engine = engine
+    warmup["state"] = "ready"
+    print(f"RAG engine ready! ({timings})", flush=True)
+    return engine
+
+
+def _start_warmup():
+    """Start building the engine unless it is built or being built.
+
+    Every caller shares this one task, so a burst of requests during a cold
+    start opens a single engine (and a single set of Neon connections).
+    A failed warmup is retried by the next caller.
+    """
+    global _warmup_task
+    if rag_engine is None and (_warmup_task is None or _warmup_task.done()):
+        warmup.update(state="warming", error=None, attempts=warmup["attempts"] + 1)
+        _warmup_task = asyncio.ensure_future(_build_engine())
+        # failures are reported through warmup["error"]; don't log them again at GC
+        _warmup_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+    return _warmup_task
+
+
+async def get_engine():
+    """Return the RAG engine, waiting for the warmup if it is still running."""
+    if rag_engine is not None:
+        return rag_engine
+    return await asyncio.shield(_start_warmup())
+
+
+@app.on_event("startup")
+async def start_warmup():
+    """Begin warming the engine without holding up the port opening."""
+    if os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true":
+        _start_warmup()
+
+
+@app.on_event("shutdown")
+async def close_engine():
+    """Release pooled database connections on shutdown."""
+    if rag_engine is not None:
+        await rag_engine.close()
 
 
 # ──────────────────────────────────────────────────────────────
@@ -93,17 +207,49 @@ async def root():
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
-    try:
-        get_engine()
+    """Healthy once the engine is warm. Never waits for the warmup, only (re)starts it."""
+    if rag_engine is not None:
         return {"status": "healthy", "message": "RAG system is operational"}
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"RAG engine not ready: {str(e)}")
+    _start_warmup()
+    detail = warmup["error"] or "warming up"
+    raise HTTPException(status_code=503, detail=f"RAG engine not ready: {detail}")
+
+
+@app.get("/livez", tags=["Health"])
+async def livez():
+    """The process is up and serving; touches nothing else."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz", tags=["Health"])
+async def readyz():
+    """Ready when the engine is warm and the dependencies it needs respond.
+
+    Reports the warmup state and per-component start-up timings, plus
+    dependency checks cached for READY_CHECK_TTL seconds. Answers 503 until
+    ready; a failed warmup is retried from here.
+    """
+    body = {"status": "warming", "warmup": warmup}
+    if rag_engine is None:
+        if warmup["state"] in ("idle", "failed"):
+            _start_warmup()
+        return JSONResponse(body, status_code=503)
+
+    dependencies = await rag_engine.check_dependencies()
+    body.update(status="ready" if dependencies["ok"] else "degraded", dependencies=dependencies)
+    return JSONResponse(body, status_code=200 if dependencies["ok"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Stats"])
+async def get_metrics():
+    """Prometheus text-format latency histograms and counters."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/stats", response_model=StatsResponse, tags=["Stats"])
 async def get_stats():
     try:
-        engine = get_engine()
+        engine = await get_engine()
         return await engine.get_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting stats: {str(e)}")
@@ -116,13 +262,16 @@ async def query(request: QueryRequest):
 
     try:
         print(f"[QUERY] Question: '{request.question[:80]}'", flush=True)
-        engine = get_engine()
-        result = await engine.query(request.question, k=request.k)
+        engine = await get_engine()
+        result = await engine.query(
+            request.question, k=request.k, retrieval=request.retrieval, adaptive_k=request.adaptive_k
+        )
         print(f"[QUERY] OK — {len(result['sources'])} sources, answer length={len(result['answer'])}", flush=True)
         return {
             "question": request.question,
             "answer": result["answer"],
             "sources": result["sources"],
+            "k_used": result.get("k_used"),
         }
     except Exception as e:
         print(f"[QUERY] FAILED:", flush=True)
@@ -130,6 +279,81 @@ async def query(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/query/stream", tags=["Query"])
+async def query_stream(request: QueryRequest):
+    """Stream a query as server-sent events.
+
+    Emits `sources` as soon as retrieval returns, then `token` events as
+    Gemini streams the answer, then `done` with per-stage timings. Failures
+    after the stream has started are reported as an `error` event.
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    try:
+        engine = await get_engine()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"RAG engine not ready: {str(e)}")
+
+    async def events():
+        print(f"[QUERY/STREAM] Question: '{request.question[:80]}'", flush=True)
+        try:
+            async for event, data in engine.query_stream(
+                request.question, k=request.k, retrieval=request.retrieval, adaptive_k=request.adaptive_k
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            print(f"[QUERY/STREAM] FAILED:", flush=True)
+            traceback.print_exc()
+            yield _sse("error", {"detail": f"Query failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/query/batch", tags=["Query"])
+async def query_batch(request: BatchQueryRequest):
+    """Answer many questions in one request, streamed as NDJSON.
+
+    Each line is {"index", "question", "answer", "sources"} (or "error" in
+    place of answer/sources) for one question, in completion order; `index`
+    is the question's position in the request. A failure that affects the
+    whole batch (embedding or search) ends the stream with {"error": ...}.
+    """
+    if any(not question or not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+
+    try:
+        engine = await get_engine()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"RAG engine not ready: {str(e)}")
+
+    async def lines():
+        print(f"[QUERY/BATCH] {len(request.questions)} questions", flush=True)
+        try:
+            async for result in engine.query_batch(
+                request.questions, k=request.k, retrieval=request.retrieval, adaptive_k=request.adaptive_k
+            ):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            print(f"[QUERY/BATCH] FAILED:", flush=True)
+            traceback.print_exc()
+            yield json.dumps({"error": f"Batch failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # ──────────────────────────────────────────────────────────────
 # Run with: python src/api/main.py
@@ -0,0 +1,124 @@
+import re
+import copy
+import time
+import numpy as np
+
+# Tokens with a digit ("16(4)", "12/2019", "gstr-3b", "2023-24") and month
+# names: questions differing only in these embed almost identically but
+# need different answers
+_IDENTIFIER = re.compile(r"[\w/().-]*\d[\w/().-]*")
+_MONTHS = re.compile(
+    r"\b(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b"
+)
+
+
+def _trim(token: str) -> str:
+    """Drop sentence punctuation and unbalanced brackets around a token ("(16(4))." -> "16(4)")."""
+    token = token.strip(".-")
+    while token.endswith(")") and token.count(")") > token.count("("):
+        token = token[:-1].rstrip(".-")
+    while token.startswith("(") and token.count("(") > token.count(")"):
+        token = token[1:].lstrip(".-")
+    return token
+
+
+def question_identifiers(question: str) -> str:
+    """The question's identifier tokens, as a key two questions must share to share an answer."""
+    text = question.casefold()
+    tokens = {_trim(token) for token in _IDENTIFIER.findall(text)}
+    tokens.update(month[:3] for month in _MONTHS.findall(text))
+    return " ".join(sorted(tokens))
+
+
+class SemanticAnswerCache:
+    """Cache of generated answers looked up by question-embedding similarity.
+
+    Entries live in a fixed-size float32 ring buffer of unit vectors, so a
+    lookup is one matrix-vector product. A stored answer is returned when a
+    past question with the same k, variant (e.g. retrieval mode) and
+    identifiers (section/notification numbers, forms, months, years; see
+    question_identifiers) has cosine similarity >= threshold.
+
+    Every lookup and store carries the current corpus version; when it changes
+    (document_chunks was modified) the whole cache is dropped.
+    """
+
+    def __init__(self, dim: int, max_size: int = 1024, threshold: float = 0.95, ttl: float = 3600):
+        self.dim = dim
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._clear()
+
+    def _clear(self):
+        self._vectors = np.zeros((self.max_size, self.dim), dtype=np.float32)
+        self._k = np.zeros(self.max_size, dtype=np.int32)  # k == 0 marks an empty slot
+        self._variant = np.full(self.max_size, "", dtype=object)
+        self._identifiers = np.full(self.max_size, "", dtype=object)
+        self._created_at = np.zeros(self.max_size, dtype=np.float64)
+        self._results: list[dict | None] = [None] * self.max_size
+        self._next = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+                print(f"[AnswerCache] Corpus changed ({self.version} -> {version}), cache cleared", flush=True)
+            self._clear()
+            self.version = version
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str, embedding, k: int, version=None, variant: str = "") -> dict | None:
+        """Return a copy of the closest cached result, or None if nothing passes the threshold."""
+        self._check_version(version)
+
+        scores = self._vectors @ self._unit(embedding)
+        stale = (
+            (self._k != k)
+            | (self._variant != variant)
+            | (self._identifiers != question_identifiers(question))
+            | (time.time() - self._created_at >= self.ttl)
+        )
+        scores[stale] = -np.inf
+
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            self.hits += 1
+            print(f"[AnswerCache] Hit (similarity={scores[best]:.3f})", flush=True)
+            return copy.deepcopy(self._results[best])
+
+        self.misses += 1
+        return None
+
+    def store(self, question: str, embedding, k: int, result: dict, version=None, variant: str = ""):
+        """Remember a result, overwriting the oldest slot when full."""
+        self._check_version(version)
+
+        slot = self._next
+        self._vectors[slot] = self._unit(embedding)
+        self._k[slot] = k
+        self._variant[slot] = variant
+        self._identifiers[slot] = question_identifiers(question)
+        self._created_at[slot] = time.time()
+        self._results[slot] = copy.deepcopy(result)
+        self._next = (slot + 1) % self.max_size
+
+    def stats(self) -> dict:
+        return {
+            "size": int(np.count_nonzero(self._k)),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
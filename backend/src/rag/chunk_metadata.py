@@ -0,0 +1,40 @@
+def parse_chunk_metadata(content: str) -> dict:
+    """Extract title and notification_number from the content header.
+
+    Each chunk starts with:
+        Document: <Title>
+        Notification: <NotificationNumber>
+
+        <actual content>
+
+    Also returns body_offset, the character offset of the stripped body in
+    `content`, which ingestion stores so the database can return the body
+    without the header (see scripts/add_chunk_metadata_columns.sql).
+    """
+    title = "Unknown Document"
+    notification = "N/A"
+    body = content
+    body_offset = 0
+
+    lines = content.split("\n", 3)  # split into at most 4 parts
+    for line in lines[:2]:
+        if line.startswith("Document:"):
+            title = line.replace("Document:", "").strip()
+        elif line.startswith("Notification:"):
+            notification = line.replace("Notification:", "").strip()
+
+    # Body is everything after the header (skip title, notification, blank line)
+    if len(lines) > 2:
+        header_lines = 3 if len(lines) == 4 else 2
+        body_offset = sum(len(line) + 1 for line in lines[:header_lines])
+        body = content[body_offset:]
+
+    stripped = body.lstrip()
+    body_offset += len(body) - len(stripped)
+
+    return {
+        "title": title,
+        "notification": notification,
+        "body": stripped.rstrip(),
+        "body_offset": body_offset,
+    }
@@ -0,0 +1,97 @@
+import re
+
+_WORD = re.compile(r"\w+")
+SHINGLE_SIZE = 5
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """Hashes of the overlapping `size`-word sequences in `text` (case-folded)."""
+    words = _WORD.findall(text.casefold())
+    if len(words) <= size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i : i + size])) for i in range(len(words) - size + 1)}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for chunks without a `tokens` value (~4 chars per token)."""
+    return max(1, len(text) // 4)
+
+
+def adaptive_cutoff(
+    docs: list[dict], min_k: int = 3, relative_threshold: float = 0.85, max_gap: float = 0.08
+) -> list[dict]:
+    """Keep the leading chunks whose scores stay close to the best one.
+
+    Scores are rrf_score when present (hybrid retrieval), otherwise
+    similarity; docs must be best-first. Stops at the first chunk scoring
+    below relative_threshold * top, or falling more than max_gap * top below
+    the chunk before it. Never returns fewer than min_k chunks (or all of
+    them, if there are fewer).
+    """
+    if len(docs) <= min_k:
+        return docs
+
+    key = "rrf_score" if docs[0].get("rrf_score") is not None else "similarity"
+    scores = [doc.get(key) or 0.0 for doc in docs]
+    top = scores[0]
+    if top <= 0:
+        return docs
+
+    cut = len(docs)
+    for i in range(1, len(docs)):
+        if scores[i] < relative_threshold * top or scores[i - 1] - scores[i] > max_gap * top:
+            cut = i
+            break
+    return docs[: max(cut, min_k)]
+
+
+def pack_context(
+    docs: list[dict],
+    token_budget: int = 6000,
+    max_per_document: int = 4,
+    duplicate_threshold: float = 0.8,
+) -> tuple[list[dict], dict]:
+    """Choose which retrieved chunks go into the prompt, best-ranked first.
+
+    A chunk is dropped when its shingle-set Jaccard similarity to an already
+    kept chunk reaches `duplicate_threshold` (overlapping chunks of the same
+    notification), when its document already has `max_per_document` chunks,
+    or when it would overflow `token_budget` (counted with the chunk's
+    `tokens` column). A later, smaller chunk may still fit after a skip.
+    The top chunk is always kept. A budget or cap of 0 disables that limit.
+
+    Returns (kept docs, counters for logging).
+    """
+    kept, kept_shingles = [], []
+    per_document: dict[object, int] = {}
+    used = 0
+    dropped = {"duplicate": 0, "per_document": 0, "budget": 0}
+
+    for doc in docs:
+        document_id = doc.get("document_id")
+        if max_per_document and per_document.get(document_id, 0) >= max_per_document:
+            dropped["per_document"] += 1
+            continue
+
+        body_shingles = shingles(doc.get("body") or "")
+        if any(_jaccard(body_shingles, other) >= duplicate_threshold for other in kept_shingles):
+            dropped["duplicate"] += 1
+            continue
+
+        tokens = doc.get("tokens") or estimate_tokens(doc.get("body") or "")
+        if token_budget and kept and used + tokens > token_budget:
+            dropped["budget"] += 1
+            continue
+
+        kept.append(doc)
+        kept_shingles.append(body_shingles)
+        per_document[document_id] = per_document.get(document_id, 0) + 1
+        used += tokens
+
+    return kept, {"kept": len(kept), "retrieved": len(docs), "tokens": used, **dropped}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,76 @@
+import asyncio
+
+
+class EmbeddingBatcher:
+    """Micro-batch concurrent embedding requests into one API call.
+
+    embed() parks each text until the window (seconds) after the first
+    pending text has passed, or until max_batch texts are waiting, then sends
+    them all through `embed_many` (an async callable taking a list of texts
+    and returning their vectors in order) and hands each caller its vector.
+    A failed call fails every text in that batch. A lone request pays at most
+    one window of extra latency.
+    """
+
+    def __init__(self, embed_many, window: float = 0.005, max_batch: int = 100):
+        self.embed_many = embed_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        # asyncio only holds weak references to tasks; keep running batches alive
+        self._tasks: set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        """Hand everything pending to one embed_many call."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = list(dict.fromkeys(text for text, _ in batch))  # identical texts embed once
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            vectors = await self.embed_many(texts)
+            if len(vectors) != len(texts):
+                raise RuntimeError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
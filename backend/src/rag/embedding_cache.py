@@ -0,0 +1,161 @@
+import re
+import time
+import array
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question for cache lookups.
+
+    Case-folds, replaces punctuation with spaces and collapses whitespace, so
+    "What is GST?" and "what is  GST" share a key while "16(4)" and "164" do not.
+    """
+    text = _PUNCTUATION.sub(" ", text.casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class EmbeddingCache:
+    """LRU + TTL cache of question embeddings with an optional on-disk tier.
+
+    Keys combine the normalized question with the embed model and output
+    dimension, so switching either never returns a stale vector. The disk tier
+    is a small SQLite file that survives restarts; memory misses fall through
+    to it and are promoted back into the LRU.
+
+    Lookups are async (get_async) so disk reads run in a worker thread.
+    put() never touches the disk itself: writes are queued and committed in
+    batches by a worker thread (or inline when no loop is running).
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 86400, disk_path: str | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._queue_lock = threading.Lock()  # guards _pending_writes only, never held during I/O
+        self._pending_writes: list[tuple[str, float, bytes]] = []
+        self._flush_task = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, created_at REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(question: str, model: str, dim: int) -> str:
+        return f"{model}:{dim}:{normalize_question(question)}"
+
+    async def get_async(self, question: str, model: str, dim: int) -> list[float] | None:
+        """Return the cached embedding, or None on a miss or expired entry.
+
+        A memory miss reads the disk tier in a worker thread.
+        """
+        key = self.make_key(question, model, dim)
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, vector = entry
+            if now - created_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            del self._entries[key]
+
+        if self._disk is not None:
+            return self._promote(key, now, await asyncio.to_thread(self._read_disk, key))
+
+        self.misses += 1
+        return None
+
+    def _read_disk(self, key: str):
+        with self._disk_lock:
+            if self._disk is None:
+                return None
+            return self._disk.execute("SELECT created_at, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+
+    def _promote(self, key: str, now: float, row) -> list[float] | None:
+        if row is not None and now - row[0] < self.ttl:
+            vector = array.array("f", row[1]).tolist()
+            self._remember(key, row[0], vector)
+            self.disk_hits += 1
+            return vector
+        self.misses += 1
+        return None
+
+    def put(self, question: str, model: str, dim: int, embedding: list[float]):
+        """Store an embedding in memory and, if enabled, on disk."""
+        key = self.make_key(question, model, dim)
+        created_at = time.time()
+        vector = list(embedding)
+        self._remember(key, created_at, vector)
+
+        if self._disk is not None:
+            with self._queue_lock:
+                self._pending_writes.append((key, created_at, array.array("f", vector).tobytes()))
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Commit queued writes in a worker thread, one flush at a time."""
+        if self._flush_task is not None and not self._flush_task.done():
+            return  # the running flush picks the new writes up, or reschedules
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._flush()
+            return
+        self._flush_task = asyncio.ensure_future(asyncio.to_thread(self._flush))
+        self._flush_task.add_done_callback(self._flushed)
+
+    def _flushed(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[EmbeddingCache] Disk write failed: {task.exception()}", flush=True)
+        if self._pending_writes:
+            self._schedule_flush()
+
+    def _flush(self):
+        with self._disk_lock:
+            with self._queue_lock:
+                batch, self._pending_writes = self._pending_writes, []
+            if not batch or self._disk is None:
+                return
+            self._disk.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, created_at, vector) VALUES (?, ?, ?)", batch
+            )
+            self._disk.commit()
+
+    def _remember(self, key: str, created_at: float, vector: list[float]):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        """Commit any queued writes and close the disk tier."""
+        self._flush()
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
@@ -0,0 +1,68 @@
+import numpy as np
+
+from .snapshot import Snapshot, load_snapshot
+
+
+class LocalVectorIndex:
+    """Exact in-memory vector search over a local snapshot of document_chunks.
+
+    The snapshot's vector matrix is memory-mapped, not copied; cosine
+    similarity is the raw dot product divided by the precomputed row norms,
+    so a top-k query is one matrix-vector product plus argpartition.
+    search() returns rows in the same shape as the match_documents SQL
+    function, so it can stand in for the Neon round trip.
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        self.snapshot = snapshot
+        self.vectors = snapshot.vectors
+        norms = np.asarray(snapshot.norms, dtype=np.float32)
+        self.norms = np.where(norms == 0, 1.0, norms).astype(np.float32)
+        # Chunks backed up without an embedding are never returned
+        self.missing = ~snapshot.has_embedding if not snapshot.has_embedding.all() else None
+        self.searchable = int(snapshot.has_embedding.sum())
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    @property
+    def dim(self) -> int:
+        return self.snapshot.dim
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        """Open a snapshot directory (see scripts/build_snapshot.py)."""
+        return cls(load_snapshot(path))
+
+    def search(self, embedding, k: int = 10) -> list[dict]:
+        """Return the k most similar chunks, best first, with cosine similarity."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = (self.vectors @ query) / self.norms
+        if self.missing is not None:
+            scores[self.missing] = -np.inf
+        k = min(k, self.searchable)
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        docs = []
+        for i in top:
+            row = self.snapshot.row(int(i))
+            docs.append(
+                {
+                    "id": row["id"],
+                    "content": row["content"],
+                    "document_id": row["document_id"],
+                    "section_number": row["section_number"],
+                    "page_numbers": row["page_numbers"],
+                    "tokens": row["tokens"],
+                    "similarity": float(scores[i]),
+                }
+            )
+        return docs
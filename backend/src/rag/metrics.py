@@ -0,0 +1,183 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts keyed by label values; render()
+writes them (plus any registered collectors) for GET /metrics. timed()
+measures one pipeline stage: it feeds the stage histogram, counts errors by
+exception class, and records "<stage>_ms" in the current request's timings
+(see start_request_timings), which the API returns as a Server-Timing header.
+"""
+
+import time
+import bisect
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 6000, 8000, 12000, 16000, 32000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # per label set: [count per bucket..., +Inf count], sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total[0]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def set_collector(self, key: str, fn):
+        """Add (or replace) a callable read at render time.
+
+        It returns [(name, type, help, samples)], where samples maps a tuple
+        of (label, value) pairs to a number, e.g. {(("cache", "answer"),): 12}.
+        """
+        self._collectors[key] = fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors.values():
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples.items():
+                    names, values = tuple(n for n, _ in labels), tuple(v for _, v in labels)
+                    lines.append(f"{name}{_labels(names, values)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram("vedan_request_seconds", "HTTP request latency (until response start for streams).", ("path",))
+)
+REQUESTS = REGISTRY.register(Counter("vedan_requests_total", "HTTP requests by path and status.", ("path", "status")))
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("vedan_stage_seconds", "Latency of each query pipeline stage.", ("stage",))
+)
+STAGE_ERRORS = REGISTRY.register(
+    Counter("vedan_stage_errors_total", "Pipeline stage failures by exception class.", ("stage", "error"))
+)
+NEON_FALLBACKS = REGISTRY.register(
+    Counter("vedan_neon_fallbacks_total", "Searches retried on the local index after Neon failed or timed out.")
+)
+CONTEXT_TOKENS = REGISTRY.register(
+    Histogram("vedan_context_tokens", "Context tokens packed into each prompt.", buckets=TOKEN_BUCKETS)
+)
+GEMINI_TOKENS = REGISTRY.register(
+    Counter("vedan_gemini_tokens_total", "Gemini generation tokens reported by the API.", ("kind",))
+)
+
+_request_timings: contextvars.ContextVar[dict | None] = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> dict:
+    """Start collecting stage timings for the current request; returns the dict they go into."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timed(stage: str):
+    """Time one pipeline stage into the histogram and the request's timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[f"{stage}_ms"] = round(timings.get(f"{stage}_ms", 0) + seconds * 1000, 1)
+
+
+def stage(name: str):
+    """Decorator form of timed() for plain and async functions."""
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with timed(name):
+                    return await fn(*args, **kwargs)
+
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with timed(name):
+                return fn(*args, **kwargs)
+
+        return run
+
+    return decorate
+
+
+def server_timing(timings: dict) -> str:
+    """Format request timings as a Server-Timing header value."""
+    return ", ".join(f"{key[:-3]};dur={value}" for key, value in timings.items() if key.endswith("_ms"))
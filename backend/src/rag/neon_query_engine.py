@@ -1,149 +1,550 @@
 import os
 import re
-import psycopg2
+import time
+import asyncio
 from dotenv import load_dotenv
 from google import genai
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from . import metrics
+from .answer_cache import SemanticAnswerCache
+from .chunk_metadata import parse_chunk_metadata
+from .context_packer import adaptive_cutoff, pack_context
+from .embed_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache, normalize_question
+from .local_index import LocalVectorIndex
+from .query_router import route_question
+from .singleflight import SingleFlight
 
 load_dotenv()
 
+MATCH_DOCUMENTS_SQL = "SELECT * FROM match_documents(%s::vector, %s)"
+MATCH_DOCUMENTS_HYBRID_SQL = "SELECT * FROM match_documents_hybrid(%s::vector, %s, %s, %s)"
+# Many searches in one statement: a LATERAL call per vector, tagged with the
+# 0-based position of its question
+MATCH_DOCUMENTS_BATCH_SQL = """SELECT q.ord - 1 AS query_index, m.*
+FROM unnest(%s::text[]::vector[]) WITH ORDINALITY AS q(embedding, ord)
+CROSS JOIN LATERAL match_documents(q.embedding, %s) AS m
+ORDER BY q.ord, m.similarity DESC"""
+MATCH_DOCUMENTS_HYBRID_BATCH_SQL = """SELECT q.ord - 1 AS query_index, m.*
+FROM unnest(%s::text[]::vector[], %s::text[]) WITH ORDINALITY AS q(embedding, question, ord)
+CROSS JOIN LATERAL match_documents_hybrid(q.embedding, q.question, %s, %s) AS m
+ORDER BY q.ord, m.rrf_score DESC"""
+CORPUS_VERSION_SQL = "SELECT version FROM corpus_version"
+
+# Identifier fast path (see query_router.py): plain btree lookups, no embedding.
+# Rows have the match_documents shape; similarity is 1.0 for an exact reference.
+_LOOKUP_COLUMNS = """dc.id, dc.document_id, dc.section_number, dc.page_numbers, dc.tokens,
+       dc.title, dc.notification_number,
+       CASE WHEN dc.body_offset IS NULL THEN dc.content
+            ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+       1.0::float AS similarity"""
+NOTIFICATION_LOOKUP_SQL = f"""SELECT {_LOOKUP_COLUMNS}
+FROM documents d
+JOIN document_chunks dc ON dc.document_id = d.id::text
+WHERE d.notification_number = %s OR d.notification_number LIKE %s
+ORDER BY d.notification_number, dc.chunk_index
+LIMIT %s"""
+SECTION_LOOKUP_SQL = f"""SELECT {_LOOKUP_COLUMNS}
+FROM document_chunks dc
+WHERE dc.section_number = ANY(%s)
+ORDER BY array_position(%s::text[], dc.section_number), dc.document_id, dc.chunk_index
+LIMIT %s"""
+
+# Chunk counts overall and per document / tax type / embedding model, in one
+# scan; the GROUPING() bitmask tells the grouping sets apart (a plain NULL
+# key could be either the total row or a chunk with no tax_type)
+STATS_SQL = """SELECT GROUPING(dc.document_id, d.tax_type, dc.embed_model) AS grouping_set,
+       dc.document_id, d.tax_type, dc.embed_model, COUNT(*) AS chunks
+FROM document_chunks dc
+LEFT JOIN documents d ON d.id::text = dc.document_id
+GROUP BY GROUPING SETS ((), (dc.document_id), (d.tax_type), (dc.embed_model))"""
+STATS_ESTIMATE_SQL = "SELECT reltuples::bigint AS total FROM pg_class WHERE oid = 'document_chunks'::regclass"
+# GROUPING() bit set for each column left out of the set
+_STATS_BREAKDOWNS = {0b011: ("by_document", "document_id"), 0b101: ("by_tax_type", "tax_type"), 0b110: ("by_embed_model", "embed_model")}
+
+RETRIEVAL_BACKENDS = ("neon", "local", "fallback")
+RETRIEVAL_MODES = ("vector", "hybrid")
+
+NO_RESULTS_ANSWER = "I couldn't find any relevant information in the documents."
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
 
 class NeonRAGEngine:
     """RAG engine using Neon PostgreSQL (pgvector) for retrieval and Gemini for generation."""
 
     def __init__(self):
         print("Initializing Neon RAG engine...", flush=True)
+        # Start-up cost of each component, reported by /readyz
+        self.init_timings = {}
+
+        # --- Retrieval backend ---
+        # neon:     match_documents in Neon (default)
+        # local:    in-memory index over LOCAL_INDEX_PATH, no database at all
+        # fallback: Neon, switching to the local index when Neon errors or
+        #           takes longer than NEON_SEARCH_TIMEOUT (e.g. a cold start)
+        self.retrieval_backend = os.getenv("RETRIEVAL_BACKEND", "neon").lower()
+        if self.retrieval_backend not in RETRIEVAL_BACKENDS:
+            raise ValueError(f"RETRIEVAL_BACKEND must be one of {', '.join(RETRIEVAL_BACKENDS)}")
+        self.local_index_path = os.getenv("LOCAL_INDEX_PATH", "corpus.snapshot")
+        self.neon_search_timeout = float(os.getenv("NEON_SEARCH_TIMEOUT", 5))
+        # Candidates per ranking (vector and full-text) fused by hybrid retrieval
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", 50))
+        # Notification/section references skip embedding (and, for "show ..."
+        # requests, generation); text-only replies return up to this many chunks
+        self.identifier_routing = os.getenv("IDENTIFIER_ROUTING", "true").lower() == "true"
+        self.lookup_max_chunks = int(os.getenv("LOOKUP_MAX_CHUNKS", 40))
+        # Prompt packing: near-duplicate removal, per-document cap, token budget
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+        self.context_max_per_document = int(os.getenv("CONTEXT_MAX_PER_DOCUMENT", 4))
+        self.context_duplicate_threshold = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", 0.8))
+        # Adaptive k: never fewer than ADAPTIVE_K_MIN chunks; stop below
+        # ADAPTIVE_K_RELATIVE x the top score or at a drop of ADAPTIVE_K_GAP x top
+        self.adaptive_k_min = int(os.getenv("ADAPTIVE_K_MIN", 3))
+        self.adaptive_k_relative = float(os.getenv("ADAPTIVE_K_RELATIVE", 0.85))
+        self.adaptive_k_gap = float(os.getenv("ADAPTIVE_K_GAP", 0.08))
+        # Generations running at once for a single /query/batch request
+        self.batch_concurrency = int(os.getenv("BATCH_GENERATE_CONCURRENCY", 4))
+        self.local_index = None
 
         # --- Neon PostgreSQL connection ---
         self.database_url = os.getenv("DATABASE_URL")
-        if not self.database_url:
+        if not self.database_url and self.retrieval_backend != "local":
             raise ValueError("DATABASE_URL must be set in .env")
 
-        # Test connection
-        conn = psycopg2.connect(self.database_url)
-        conn.close()
+        # Connection pool shared by every query. It is created closed and
+        # opened on the running event loop by open(), so pool waits never
+        # block uvicorn's loop. The local backend never opens one, even when
+        # DATABASE_URL is set: lookups, corpus_version and stats then all
+        # come from the local index too.
+        self.prepare_statements = os.getenv("NEON_PREPARE_STATEMENTS", "true").lower() == "true"
+        self.pool = None
+        if self.database_url and self.retrieval_backend != "local":
+            self.pool = AsyncConnectionPool(
+                self.database_url,
+                min_size=int(os.getenv("NEON_POOL_MIN_SIZE", 1)),
+                max_size=int(os.getenv("NEON_POOL_MAX_SIZE", 10)),
+                max_idle=float(os.getenv("NEON_POOL_MAX_IDLE", 300)),
+                timeout=float(os.getenv("NEON_POOL_TIMEOUT", 30)),
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+            )
 
         # --- Gemini Client ---
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY must be set in .env")
 
+        start = time.perf_counter()
         self.client = genai.Client(api_key=api_key)
+        self.init_timings["gemini_client_ms"] = _elapsed_ms(start)
         self.embed_model = "gemini-embedding-001"
         self.embed_dim = 768
         self.model_name = "gemini-2.5-flash"
 
+        # --- Question-embedding cache (EMBED_CACHE_PATH enables the disk tier) ---
+        start = time.perf_counter()
+        self.embedding_cache = EmbeddingCache(
+            max_size=int(os.getenv("EMBED_CACHE_SIZE", 2048)),
+            ttl=float(os.getenv("EMBED_CACHE_TTL", 86400)),
+            disk_path=os.getenv("EMBED_CACHE_PATH") or None,
+        )
+        self.init_timings["embedding_cache_ms"] = _elapsed_ms(start)
+
+        # --- Micro-batching of concurrent question embeddings ---
+        # Misses arriving within EMBED_BATCH_WINDOW_MS of each other share one
+        # embed_content call (0 disables)
+        self.embed_batcher = None
+        embed_batch_window = float(os.getenv("EMBED_BATCH_WINDOW_MS", 5)) / 1000
+        if embed_batch_window > 0:
+            self.embed_batcher = EmbeddingBatcher(
+                self._embed_texts,
+                window=embed_batch_window,
+                max_batch=int(os.getenv("EMBED_BATCH_MAX", 100)),
+            )
+
+        # --- Semantic answer cache, invalidated when corpus_version changes ---
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+            self.answer_cache = SemanticAnswerCache(
+                dim=self.embed_dim,
+                max_size=int(os.getenv("ANSWER_CACHE_SIZE", 1024)),
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)),
+                ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+            )
+        self.corpus_version_ttl = float(os.getenv("CORPUS_VERSION_TTL", 30))
+        self._corpus_version = None
+        self._corpus_version_checked_at = 0.0
+
+        # --- Coalescing of identical concurrent queries ---
+        self.inflight = None
+        if os.getenv("QUERY_COALESCING", "true").lower() == "true":
+            self.inflight = SingleFlight()
+
+        # --- Dependency checks for /readyz, cached so probes stay cheap ---
+        self.ready_check_ttl = float(os.getenv("READY_CHECK_TTL", 15))
+        self.ready_check_timeout = float(os.getenv("READY_CHECK_TIMEOUT", 2))
+        self._dependency_checks = None
+        self._dependency_checked_at = 0.0
+        self._dependency_flight = SingleFlight()
+
+        # --- /stats cache: served stale while a refresh runs in the background ---
+        # Refreshed every STATS_TTL seconds or when corpus_version changes;
+        # STATS_COUNT=estimate reads the planner's row estimate (no scan, no breakdowns)
+        self.stats_ttl = float(os.getenv("STATS_TTL", 300))
+        self.stats_estimate = os.getenv("STATS_COUNT", "exact").lower() == "estimate"
+        self._stats = None
+        self._stats_refreshed_at = 0.0
+        self._stats_version = None
+        self._stats_flight = SingleFlight()
+        self._stats_refresh = None  # background refresh task, referenced so it is not collected
+
+        metrics.REGISTRY.set_collector("engine", self._collect_metrics)
+
         print("Neon RAG engine ready!", flush=True)
 
     # --------------------------------------------------------------------- #
-    #  Helper: get a fresh DB connection
+    #  Connection pool + local index lifecycle
     # --------------------------------------------------------------------- #
-    def _get_conn(self):
-        return psycopg2.connect(self.database_url)
+    async def open(self):
+        """Open the connection pool and load the local index, if configured.
+
+        With the neon backend this doubles as the start-up connectivity test:
+        it waits for min_size connections and raises if Neon is unreachable.
+        In fallback mode the pool connects in the background instead, so a
+        cold Neon does not hold up start-up.
+        """
+        if self.retrieval_backend in ("local", "fallback"):
+            print(f"[RAG] Loading local index from {self.local_index_path}...", flush=True)
+            start = time.perf_counter()
+            self.local_index = await asyncio.to_thread(LocalVectorIndex.load, self.local_index_path)
+            self.init_timings["local_index_ms"] = _elapsed_ms(start)
+            print(f"[RAG] Local index ready: {len(self.local_index)} chunks", flush=True)
+
+        if self.pool is not None:
+            start = time.perf_counter()
+            await self.pool.open(wait=self.retrieval_backend == "neon")
+            self.init_timings["pool_open_ms"] = _elapsed_ms(start)
+            print(f"[RAG] Connection pool open (min={self.pool.min_size}, max={self.pool.max_size})", flush=True)
+
+    async def close(self):
+        """Close the connection pool and the embedding cache."""
+        if self.pool is not None:
+            await self.pool.close()
+        self.embedding_cache.close()
 
     # --------------------------------------------------------------------- #
-    #  Parse metadata from chunk content header
+    #  Chunk metadata (title / notification / body)
     # --------------------------------------------------------------------- #
     @staticmethod
-    def _parse_chunk_metadata(content: str) -> dict:
-        """Extract title and notification_number from the content header.
-
-        Each chunk starts with:
-            Document: <Title>
-            Notification: <NotificationNumber>
+    def _attach_metadata(docs: list[dict]) -> list[dict]:
+        """Give every doc title, notification_number and body, once per retrieval.
 
-            <actual content>
+        match_documents returns these precomputed columns; rows from the local
+        index, or rows not yet backfilled (title IS NULL), are parsed here.
         """
-        title = "Unknown Document"
-        notification = "N/A"
-        body = content
-
-        lines = content.split("\n", 3)  # split into at most 4 parts
-        for line in lines[:2]:
-            if line.startswith("Document:"):
-                title = line.replace("Document:", "").strip()
-            elif line.startswith("Notification:"):
-                notification = line.replace("Notification:", "").strip()
-
-        # Body is everything after the header (skip title, notification, blank line)
-        if len(lines) > 2:
-            body = lines[-1] if len(lines) == 4 else "\n".join(lines[2:])
-
-        return {"title": title, "notification": notification, "body": body.strip()}
+        for doc in docs:
+            if doc.get("title") is None:
+                meta = parse_chunk_metadata(doc.get("content") or doc.get("body") or "")
+                doc["title"] = meta["title"]
+                doc["notification_number"] = meta["notification"]
+                doc["body"] = meta["body"]
+            else:
+                doc["notification_number"] = doc.get("notification_number") or "N/A"
+                doc["body"] = (doc.get("body") or "").strip()
+        return docs
 
     # --------------------------------------------------------------------- #
-    #  Vector search via Neon PostgreSQL
+    #  Question embedding (cached)
     # --------------------------------------------------------------------- #
-    def _search(self, question: str, k: int = 10) -> list[dict]:
-        """Embed the question and call the match_documents function."""
+    @metrics.stage("embed")
+    async def _embed_question(self, question: str) -> list[float]:
+        """Return the question embedding, calling Gemini only on a cache miss."""
+        embedding = await self.embedding_cache.get_async(question, self.embed_model, self.embed_dim)
+        if embedding is not None:
+            print(f"[RAG._search] Embedding cache hit", flush=True)
+            return embedding
+
         print(f"[RAG._search] Embedding question with model={self.embed_model}", flush=True)
         try:
-            result = self.client.models.embed_content(
-                model=self.embed_model,
-                contents=question,
-                config={"output_dimensionality": self.embed_dim},
-            )
-            embedding = result.embeddings[0].values
+            if self.embed_batcher is not None:
+                embedding = await self.embed_batcher.embed(question)
+            else:
+                embedding = (await self._embed_texts([question]))[0]
             print(f"[RAG._search] Embedding OK, length={len(embedding)}", flush=True)
         except Exception as e:
             print(f"[RAG._search] Embedding FAILED: {e}", flush=True)
             raise RuntimeError(f"Gemini embedding failed: {e}")
 
-        print(f"[RAG._search] Querying Neon match_documents...", flush=True)
-        conn = self._get_conn()
+        self.embedding_cache.put(question, self.embed_model, self.embed_dim, embedding)
+        return embedding
+
+    @metrics.stage("embed")
+    async def _embed_questions(self, questions: list[str]) -> list[list[float]]:
+        """Embed many questions, with one Gemini call for all the cache misses.
+
+        Questions that normalize to the same text are embedded once.
+        """
+        embeddings = [await self.embedding_cache.get_async(q, self.embed_model, self.embed_dim) for q in questions]
+
+        pending: dict[str, list[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                pending.setdefault(normalize_question(questions[i]), []).append(i)
+        if not pending:
+            return embeddings
+
+        texts = [questions[indices[0]] for indices in pending.values()]
+        print(f"[RAG._search] Embedding {len(texts)} questions in one call ({len(questions) - len(texts)} cached or repeated)", flush=True)
         try:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT * FROM match_documents(%s::vector, %s)",
-                (str(embedding), k),
-            )
-            columns = [desc[0] for desc in cur.description]
-            rows = cur.fetchall()
-            cur.close()
-        finally:
-            conn.close()
+            vectors = await self._embed_texts(texts)
+        except Exception as e:
+            print(f"[RAG._search] Embedding FAILED: {e}", flush=True)
+            raise RuntimeError(f"Gemini embedding failed: {e}")
 
-        docs = []
-        for row in rows:
-            doc = dict(zip(columns, row))
+        for text, indices, vector in zip(texts, pending.values(), vectors):
+            self.embedding_cache.put(text, self.embed_model, self.embed_dim, vector)
+            for i in indices:
+                embeddings[i] = vector
+        return embeddings
+
+    async def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """One embed_content call for a list of texts; vectors come back in order."""
+        result = await self.client.aio.models.embed_content(
+            model=self.embed_model,
+            contents=texts,
+            config={"output_dimensionality": self.embed_dim},
+        )
+        if len(texts) > 1:
+            print(f"[RAG._search] Embedded {len(texts)} texts in one call", flush=True)
+        return [item.values for item in result.embeddings]
+
+    # --------------------------------------------------------------------- #
+    #  Corpus version (bumped by a trigger on every document_chunks write)
+    # --------------------------------------------------------------------- #
+    async def _get_corpus_version(self):
+        """Return the corpus version, re-reading it at most every corpus_version_ttl seconds.
+
+        If the corpus_version table is missing or unreachable the last known
+        version is kept, so caches fall back to their own TTLs.
+        """
+        if self.pool is None:
+            return None
+
+        now = time.monotonic()
+        if now - self._corpus_version_checked_at < self.corpus_version_ttl:
+            return self._corpus_version
+
+        self._corpus_version_checked_at = now
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(CORPUS_VERSION_SQL, prepare=self.prepare_statements)
+                    row = await cur.fetchone()
+            self._corpus_version = row[0] if row else None
+        except Exception as e:
+            print(f"[RAG] Could not read corpus_version: {e}", flush=True)
+        return self._corpus_version
+
+    # --------------------------------------------------------------------- #
+    #  Vector search via Neon PostgreSQL
+    # --------------------------------------------------------------------- #
+    async def _search(self, question: str, k: int = 10, retrieval: str = "vector") -> list[dict]:
+        """Embed the question and call the match_documents function."""
+        embedding = await self._embed_question(question)
+        return await self._match_documents(embedding, k, question, retrieval)
+
+    @metrics.stage("search")
+    async def _match_documents(
+        self, embedding: list[float], k: int, question: str = "", retrieval: str = "vector"
+    ) -> list[dict]:
+        """Retrieve the top-k chunks for an already-computed embedding.
+
+        retrieval="hybrid" also ranks chunks by full-text match on `question`
+        (Neon only; the local index always does vector search).
+        """
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}")
+
+        if self.retrieval_backend == "local":
+            return self._match_documents_local(embedding, k)
+
+        if self.retrieval_backend == "fallback":
+            try:
+                return await asyncio.wait_for(
+                    self._match_documents_neon(embedding, k, question, retrieval),
+                    timeout=self.neon_search_timeout,
+                )
+            except Exception as e:
+                print(f"[RAG._search] Neon unavailable ({type(e).__name__}: {e}), using local index", flush=True)
+                metrics.NEON_FALLBACKS.inc()
+                return self._match_documents_local(embedding, k)
+
+        return await self._match_documents_neon(embedding, k, question, retrieval)
+
+    @metrics.stage("search")
+    async def _match_documents_batch(
+        self, embeddings: list[list[float]], k: int, questions: list[str], retrieval: str = "vector"
+    ) -> list[list[dict]]:
+        """Retrieve the top-k chunks for every embedding; one SQL statement on Neon."""
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {', '.join(RETRIEVAL_MODES)}")
+
+        if self.retrieval_backend == "local":
+            return [self._match_documents_local(embedding, k) for embedding in embeddings]
+
+        if self.retrieval_backend == "fallback":
+            try:
+                return await asyncio.wait_for(
+                    self._match_documents_neon_batch(embeddings, k, questions, retrieval),
+                    timeout=self.neon_search_timeout,
+                )
+            except Exception as e:
+                print(f"[RAG._search] Neon unavailable ({type(e).__name__}: {e}), using local index", flush=True)
+                metrics.NEON_FALLBACKS.inc()
+                return [self._match_documents_local(embedding, k) for embedding in embeddings]
+
+        return await self._match_documents_neon_batch(embeddings, k, questions, retrieval)
+
+    def _match_documents_local(self, embedding: list[float], k: int) -> list[dict]:
+        """Search the in-memory index; same row shape as match_documents."""
+        docs = self.local_index.search(embedding, k)
+        print(f"[RAG._search] Got {len(docs)} docs from local index", flush=True)
+        return self._attach_metadata(docs)
+
+    async def _match_documents_neon(
+        self, embedding: list[float], k: int, question: str = "", retrieval: str = "vector"
+    ) -> list[dict]:
+        """Run the match_documents (or match_documents_hybrid) SQL function."""
+        if retrieval == "hybrid":
+            sql, params = MATCH_DOCUMENTS_HYBRID_SQL, (str(embedding), question, k, self.hybrid_candidates)
+        else:
+            sql, params = MATCH_DOCUMENTS_SQL, (str(embedding), k)
+
+        print(f"[RAG._search] Querying Neon ({retrieval})...", flush=True)
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(sql, params, prepare=self.prepare_statements)
+                docs = await cur.fetchall()
+
+        for doc in docs:
             # Convert page_numbers from list to the expected format
             if doc.get("page_numbers") is None:
                 doc["page_numbers"] = []
-            docs.append(doc)
 
         print(f"[RAG._search] Got {len(docs)} docs", flush=True)
-        return docs
+        return self._attach_metadata(docs)
+
+    async def _match_documents_neon_batch(
+        self, embeddings: list[list[float]], k: int, questions: list[str], retrieval: str
+    ) -> list[list[dict]]:
+        """Run match_documents for every embedding in one LATERAL join."""
+        vectors = [str(embedding) for embedding in embeddings]
+        if retrieval == "hybrid":
+            sql, params = MATCH_DOCUMENTS_HYBRID_BATCH_SQL, (vectors, questions, k, self.hybrid_candidates)
+        else:
+            sql, params = MATCH_DOCUMENTS_BATCH_SQL, (vectors, k)
+
+        print(f"[RAG._search] Querying Neon ({retrieval}) for {len(embeddings)} questions...", flush=True)
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(sql, params, prepare=self.prepare_statements)
+                rows = await cur.fetchall()
+
+        results = [[] for _ in embeddings]
+        for row in rows:
+            if row.get("page_numbers") is None:
+                row["page_numbers"] = []
+            results[row.pop("query_index")].append(row)
+
+        print(f"[RAG._search] Got {len(rows)} docs for {len(embeddings)} questions", flush=True)
+        return [self._attach_metadata(docs) for docs in results]
 
     # --------------------------------------------------------------------- #
-    #  Full query pipeline: retrieve → generate → return
+    #  Identifier fast path: notification / section lookups
     # --------------------------------------------------------------------- #
-    def query(self, question: str, k: int = 10) -> dict:
-        """Run the full RAG pipeline and return answer + sources."""
-        docs = self._search(question, k=k)
+    def _route(self, question: str) -> dict | None:
+        """Route notification/section references when Neon can resolve them."""
+        if not self.identifier_routing or self.pool is None:
+            return None
+        return route_question(question)
 
-        if not docs:
-            return {
-                "answer": "I couldn't find any relevant information in the documents.",
-                "sources": [],
-            }
+    @metrics.stage("lookup")
+    async def _lookup_identifier(self, route: dict, k: int) -> list[dict]:
+        """Fetch the chunks a routed reference points at, through btree indexes.
+
+        Returns [] when nothing matches or the lookup fails, so the caller
+        falls back to the normal embedding search.
+        """
+        limit = self.lookup_max_chunks if route["text_only"] else k
+        values = route["values"]
+        if route["kind"] == "notification":
+            pattern = values[0] + " %" if route["prefix"] else values[0]
+            sql, params = NOTIFICATION_LOOKUP_SQL, (values[0], pattern, limit)
+        else:
+            sql, params = SECTION_LOOKUP_SQL, (values, values, limit)
 
+        async def lookup():
+            async with self.pool.connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(sql, params, prepare=self.prepare_statements)
+                    return await cur.fetchall()
+
+        try:
+            if self.retrieval_backend == "fallback":
+                docs = await asyncio.wait_for(lookup(), timeout=self.neon_search_timeout)
+            else:
+                docs = await lookup()
+        except Exception as e:
+            print(f"[RAG._lookup] {route['kind']} lookup failed ({type(e).__name__}: {e})", flush=True)
+            return []
+
+        for doc in docs:
+            if doc.get("page_numbers") is None:
+                doc["page_numbers"] = []
+        print(f"[RAG._lookup] {route['kind']} {values[0]}: {len(docs)} chunks", flush=True)
+        return self._attach_metadata(docs)
+
+    @staticmethod
+    def _format_text(docs: list[dict]) -> str:
+        """Render looked-up chunks as the answer itself, one heading per document."""
+        parts = []
+        current_title = None
+        for doc in docs:
+            if doc["title"] != current_title:
+                current_title = doc["title"]
+                parts.append(f"**{current_title}** (Notification: {doc['notification_number']})")
+            section = doc.get("section_number")
+            parts.append(f"*Section {section}*\n\n{doc['body']}" if section else doc["body"])
+        return "\n\n".join(parts)
+
+    # --------------------------------------------------------------------- #
+    #  Prompt + sources
+    # --------------------------------------------------------------------- #
+    @metrics.stage("prompt")
+    def _build_prompt(self, question: str, docs: list[dict]) -> str:
+        """Build the Gemini prompt with numbered, cited context excerpts."""
         # Build context for Gemini — use parsed metadata for clear citations
         context_parts = []
         for i, doc in enumerate(docs, 1):
-            meta = self._parse_chunk_metadata(doc.get("content", ""))
             section = doc.get("section_number", "")
             pages = doc.get("page_numbers", [])
             page_str = ", ".join(str(p) for p in pages) if pages else "N/A"
 
             context_parts.append(
-                f"[Source {i}: \"{meta['title']}\", "
-                f"Notification: {meta['notification']}, "
+                f"[Source {i}: \"{doc['title']}\", "
+                f"Notification: {doc['notification_number']}, "
                 f"Section: {section}, Pages: {page_str}]\n"
-                f"{meta['body']}\n"
+                f"{doc['body']}\n"
             )
 
         context = "\n".join(context_parts)
 
-        prompt = f"""You are Vedan AI, an expert assistant on Indian tax law (CGST, SGST, IGST, GST).
+        return f"""You are Vedan AI, an expert assistant on Indian tax law (CGST, SGST, IGST, GST).
 
 Answer the user's question using the context excerpts below.
 
@@ -163,51 +564,476 @@ Question: {question}
 
 Answer:"""
 
-        print(f"[RAG.query] Calling Gemini generate_content with model={self.model_name}", flush=True)
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-        )
-        answer = response.text
-        print(f"[RAG.query] Generation OK, answer length={len(answer)}", flush=True)
-
-        # Build rich sources — deduplicate by title
+    def _build_sources(self, docs: list[dict]) -> list[dict]:
+        """Build rich source citations, deduplicated by title."""
         seen_titles = set()
         sources = []
         for doc in docs:
-            meta = self._parse_chunk_metadata(doc.get("content", ""))
-            title = meta["title"]
+            title = doc["title"]
 
             if title in seen_titles:
                 continue
             seen_titles.add(title)
 
             pages = doc.get("page_numbers", [])
-            preview = meta["body"][:200] + "..." if len(meta["body"]) > 200 else meta["body"]
+            body = doc["body"]
+            preview = body[:200] + "..." if len(body) > 200 else body
 
             sources.append(
                 {
                     "source": title,
-                    "notification_number": meta["notification"],
+                    "notification_number": doc["notification_number"],
                     "section": doc.get("section_number", ""),
                     "page": pages[0] if pages else 0,
                     "content": preview,
                 }
             )
+        return sources
+
+    @staticmethod
+    def _cache_variant(retrieval: str, adaptive_k: bool) -> str:
+        """Answer-cache variant: answers differ by retrieval mode and adaptive k."""
+        return f"{retrieval}+adaptive" if adaptive_k else retrieval
 
-        return {"answer": answer, "sources": sources}
+    def _adapt_k(self, docs: list[dict]) -> list[dict]:
+        """Cut retrieved chunks where their scores fall away (adaptive k)."""
+        kept = adaptive_cutoff(
+            docs,
+            min_k=self.adaptive_k_min,
+            relative_threshold=self.adaptive_k_relative,
+            max_gap=self.adaptive_k_gap,
+        )
+        print(f"[RAG.adaptive_k] Using {len(kept)} of {len(docs)} chunks", flush=True)
+        return kept
+
+    @metrics.stage("pack")
+    def _pack_context(self, docs: list[dict]) -> list[dict]:
+        """Trim retrieved chunks to what is worth putting in the prompt."""
+        packed, counts = pack_context(
+            docs,
+            token_budget=self.context_token_budget,
+            max_per_document=self.context_max_per_document,
+            duplicate_threshold=self.context_duplicate_threshold,
+        )
+        metrics.CONTEXT_TOKENS.observe(counts["tokens"])
+        if len(packed) < len(docs):
+            print(
+                f"[RAG.pack] Kept {counts['kept']}/{counts['retrieved']} chunks, ~{counts['tokens']} tokens "
+                f"(dropped {counts['duplicate']} duplicate, {counts['per_document']} over per-document cap, "
+                f"{counts['budget']} over budget)",
+                flush=True,
+            )
+        return packed
+
+    @metrics.stage("generate")
+    async def _generate(self, question: str, docs: list[dict]) -> str:
+        """Generate an answer to `question` grounded in `docs`."""
+        prompt = self._build_prompt(question, docs)
+
+        print(f"[RAG.query] Calling Gemini generate_content with model={self.model_name}", flush=True)
+        response = await self.client.aio.models.generate_content(
+            model=self.model_name,
+            contents=prompt,
+        )
+        answer = response.text
+        print(f"[RAG.query] Generation OK, answer length={len(answer)}", flush=True)
+        self._count_tokens(response)
+        return answer
+
+    @staticmethod
+    def _count_tokens(response):
+        """Add a Gemini response's reported token usage to the metrics."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        metrics.GEMINI_TOKENS.inc(getattr(usage, "prompt_token_count", None) or 0, kind="prompt")
+        metrics.GEMINI_TOKENS.inc(getattr(usage, "candidates_token_count", None) or 0, kind="output")
 
     # --------------------------------------------------------------------- #
-    #  Stats
+    #  Full query pipeline: retrieve → generate → return
+    # --------------------------------------------------------------------- #
+    async def query(self, question: str, k: int = 10, retrieval: str = "vector", adaptive_k: bool = False) -> dict:
+        """Run the full RAG pipeline and return answer + sources.
+
+        With adaptive_k, k is an upper bound and the retrieved chunks are cut
+        where their scores fall away (see adaptive_cutoff); the result's
+        k_used is the number of chunks actually kept.
+
+        Concurrent calls with the same normalized question, k and options
+        share one pipeline run (see SingleFlight).
+        """
+        if self.inflight is None:
+            return await self._query(question, k, retrieval, adaptive_k)
+        key = (normalize_question(question), k, retrieval, adaptive_k)
+        return await self.inflight.do(key, lambda: self._query(question, k, retrieval, adaptive_k))
+
+    async def _query(self, question: str, k: int, retrieval: str, adaptive_k: bool) -> dict:
+        """One run of the RAG pipeline.
+
+        Notification/section lookups skip the embedding (and the caches,
+        which are keyed by it); "show ..." lookups skip generation as well.
+        """
+        embedding, version, docs = None, None, []
+        route = self._route(question)
+        if route is not None:
+            docs = await self._lookup_identifier(route, k)
+            if docs and route["text_only"]:
+                return {"answer": self._format_text(docs), "sources": self._build_sources(docs), "k_used": len(docs)}
+
+        variant = self._cache_variant(retrieval, adaptive_k)
+        if not docs:
+            embedding = await self._embed_question(question)
+
+            if self.answer_cache is not None:
+                version = await self._get_corpus_version()
+                cached = self.answer_cache.lookup(question, embedding, k, version, variant=variant)
+                if cached is not None:
+                    return cached
+
+            docs = await self._match_documents(embedding, k, question, retrieval)
+            if adaptive_k:
+                docs = self._adapt_k(docs)
+
+            if not docs:
+                return {"answer": NO_RESULTS_ANSWER, "sources": [], "k_used": 0}
+
+        k_used = len(docs)
+        docs = self._pack_context(docs)
+        answer = await self._generate(question, docs)
+
+        result = {"answer": answer, "sources": self._build_sources(docs), "k_used": k_used}
+        if self.answer_cache is not None and embedding is not None:
+            self.answer_cache.store(question, embedding, k, result, version, variant=variant)
+        return result
+
+    # --------------------------------------------------------------------- #
+    #  Batch pipeline: one embed call, one search statement, bounded generation
     # --------------------------------------------------------------------- #
-    def get_stats(self) -> dict:
-        """Return a count of rows in document_chunks."""
-        conn = self._get_conn()
+    async def query_batch(
+        self, questions: list[str], k: int = 10, retrieval: str = "vector", adaptive_k: bool = False
+    ):
+        """Answer many questions, yielding one result per question as it completes.
+
+        All questions are embedded with one Gemini call and searched with one
+        SQL statement; at most batch_concurrency generations run at a time.
+        Results arrive in completion order, each carrying its `index` in
+        `questions`; a failed generation yields {"index", "question", "error"}.
+        """
+        embeddings = await self._embed_questions(questions)
+
+        variant = self._cache_variant(retrieval, adaptive_k)
+        version = None
+        pending = list(range(len(questions)))
+        if self.answer_cache is not None:
+            version = await self._get_corpus_version()
+            misses = []
+            for i in pending:
+                cached = self.answer_cache.lookup(questions[i], embeddings[i], k, version, variant=variant)
+                if cached is not None:
+                    yield {"index": i, "question": questions[i], **cached}
+                else:
+                    misses.append(i)
+            pending = misses
+        if not pending:
+            return
+
+        all_docs = await self._match_documents_batch(
+            [embeddings[i] for i in pending], k, [questions[i] for i in pending], retrieval
+        )
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def answer(i: int, docs: list[dict]) -> tuple[int, dict]:
+            if adaptive_k:
+                docs = self._adapt_k(docs)
+            if not docs:
+                return i, {"answer": NO_RESULTS_ANSWER, "sources": [], "k_used": 0}
+            k_used = len(docs)
+            docs = self._pack_context(docs)
+            try:
+                async with semaphore:
+                    text = await self._generate(questions[i], docs)
+            except Exception as e:
+                print(f"[RAG.query_batch] Question {i} failed: {e}", flush=True)
+                return i, {"error": f"Query failed: {e}"}
+            result = {"answer": text, "sources": self._build_sources(docs), "k_used": k_used}
+            if self.answer_cache is not None:
+                self.answer_cache.store(questions[i], embeddings[i], k, result, version, variant=variant)
+            return i, result
+
+        tasks = [asyncio.ensure_future(answer(i, docs)) for i, docs in zip(pending, all_docs)]
         try:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM document_chunks")
-            total = cur.fetchone()[0]
-            cur.close()
+            for next_done in asyncio.as_completed(tasks):
+                i, result = await next_done
+                yield {"index": i, "question": questions[i], **result}
         finally:
-            conn.close()
-        return {"total_documents": total, "database": "neon"}
+            # The client went away mid-stream: stop generating for nobody
+            for task in tasks:
+                task.cancel()
+
+    # --------------------------------------------------------------------- #
+    #  Streaming pipeline: sources first, then answer tokens, then timings
+    # --------------------------------------------------------------------- #
+    async def query_stream(
+        self, question: str, k: int = 10, retrieval: str = "vector", adaptive_k: bool = False
+    ):
+        """Run the RAG pipeline, yielding (event, data) pairs as stages finish.
+
+        Events, in order:
+            ("sources", {"sources": [...], "k_used": n})   as soon as retrieval returns
+            ("token",   {"text": "..."})      for each streamed answer chunk
+            ("done",    {"timings": {...}})   stage timings in milliseconds
+        """
+        timings = {}
+        start = time.perf_counter()
+
+        def elapsed_ms(since: float) -> float:
+            return round((time.perf_counter() - since) * 1000, 1)
+
+        embedding, version, docs = None, None, []
+        route = self._route(question)
+        if route is not None:
+            stage = time.perf_counter()
+            docs = await self._lookup_identifier(route, k)
+            timings["lookup_ms"] = elapsed_ms(stage)
+            if docs:
+                timings["route"] = route["kind"]
+
+        variant = self._cache_variant(retrieval, adaptive_k)
+        if not docs:
+            stage = time.perf_counter()
+            embedding = await self._embed_question(question)
+            timings["embed_ms"] = elapsed_ms(stage)
+
+            if self.answer_cache is not None:
+                version = await self._get_corpus_version()
+                cached = self.answer_cache.lookup(question, embedding, k, version, variant=variant)
+                if cached is not None:
+                    yield "sources", {"sources": cached["sources"], "k_used": cached.get("k_used")}
+                    yield "token", {"text": cached["answer"]}
+                    timings["cached"] = True
+                    timings["total_ms"] = elapsed_ms(start)
+                    yield "done", {"timings": timings}
+                    return
+
+            stage = time.perf_counter()
+            docs = await self._match_documents(embedding, k, question, retrieval)
+            if adaptive_k:
+                docs = self._adapt_k(docs)
+            timings["search_ms"] = elapsed_ms(stage)
+
+        k_used = len(docs)
+        text_only = embedding is None and route["text_only"]
+        if not text_only:
+            docs = self._pack_context(docs)
+        sources = self._build_sources(docs)
+        yield "sources", {"sources": sources, "k_used": k_used}
+
+        if not docs:
+            yield "token", {"text": NO_RESULTS_ANSWER}
+            timings["total_ms"] = elapsed_ms(start)
+            yield "done", {"timings": timings}
+            return
+
+        if text_only:
+            yield "token", {"text": self._format_text(docs)}
+            timings["total_ms"] = elapsed_ms(start)
+            yield "done", {"timings": timings}
+            return
+
+        prompt = self._build_prompt(question, docs)
+
+        print(f"[RAG.query_stream] Streaming Gemini generate_content with model={self.model_name}", flush=True)
+        stage = time.perf_counter()
+        answer_parts = []
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=prompt,
+        )
+        chunk = None
+        async for chunk in stream:
+            text = chunk.text
+            if not text:
+                continue
+            if not answer_parts:
+                timings["first_token_ms"] = elapsed_ms(start)
+                metrics.STAGE_SECONDS.observe(timings["first_token_ms"] / 1000, stage="first_token")
+            answer_parts.append(text)
+            yield "token", {"text": text}
+        timings["generate_ms"] = elapsed_ms(stage)
+        metrics.STAGE_SECONDS.observe(timings["generate_ms"] / 1000, stage="generate_stream")
+        if chunk is not None:
+            self._count_tokens(chunk)  # the last streamed chunk carries the usage totals
+
+        answer = "".join(answer_parts)
+        print(f"[RAG.query_stream] Generation OK, answer length={len(answer)}", flush=True)
+
+        if self.answer_cache is not None and answer and embedding is not None:
+            result = {"answer": answer, "sources": sources, "k_used": k_used}
+            self.answer_cache.store(question, embedding, k, result, version, variant=variant)
+
+        timings["total_ms"] = elapsed_ms(start)
+        yield "done", {"timings": timings}
+
+    # --------------------------------------------------------------------- #
+    #  Stats
+    # --------------------------------------------------------------------- #
+    def _coalescing_stats(self) -> dict | None:
+        stats = {}
+        if self.inflight is not None:
+            stats.update(self.inflight.stats())
+        if self.embed_batcher is not None:
+            stats["embed_batching"] = self.embed_batcher.stats()
+        return stats or None
+
+    def _collect_metrics(self) -> list[tuple]:
+        """Cache, coalescing and pool counters for /metrics, read from the live objects."""
+        families = []
+        embed = self.embedding_cache.stats()
+        families.append((
+            "vedan_embedding_cache_events_total", "counter", "Question-embedding cache lookups by result.",
+            {(("result", r),): embed[key] for r, key in (("hit", "hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))},
+        ))
+        if self.answer_cache is not None:
+            answers = self.answer_cache.stats()
+            families.append((
+                "vedan_answer_cache_events_total", "counter", "Semantic answer cache events.",
+                {(("event", e),): answers[key] for e, key in (("hit", "hits"), ("miss", "misses"), ("invalidation", "invalidations"))},
+            ))
+        if self.inflight is not None:
+            flights = self.inflight.stats()
+            families.append((
+                "vedan_coalesced_queries_total", "counter", "Query calls that ran the pipeline or joined one in flight.",
+                {(("result", "executed"),): flights["executions"], (("result", "collapsed"),): flights["collapsed"]},
+            ))
+        if self.embed_batcher is not None:
+            batching = self.embed_batcher.stats()
+            families.append((
+                "vedan_embed_batcher_total", "counter", "Micro-batched embedding requests and the calls that served them.",
+                {(("kind", "request"),): batching["requests"], (("kind", "call"),): batching["batches"]},
+            ))
+        if self.pool is not None:
+            pool = self.pool.get_stats()
+            families.append((
+                "vedan_pool_connections", "gauge", "Neon connection pool state.",
+                {(("state", key),): pool.get(key, 0) for key in ("pool_size", "pool_available", "requests_waiting")},
+            ))
+        return families
+
+    async def check_dependencies(self) -> dict:
+        """Database and local-index health for /readyz, re-checked at most every ready_check_ttl seconds.
+
+        Returns {"ok", "checks": {name: {"ok", "required", ...}}}; only the
+        dependencies the retrieval backend cannot serve without are required,
+        so in fallback mode an unreachable Neon leaves the engine ready.
+        """
+        if (
+            self._dependency_checks is not None
+            and time.monotonic() - self._dependency_checked_at < self.ready_check_ttl
+        ):
+            return self._dependency_checks
+        return await self._dependency_flight.do("checks", self._run_dependency_checks)
+
+    async def _run_dependency_checks(self) -> dict:
+        checks = {}
+        if self.retrieval_backend in ("local", "fallback"):
+            loaded = self.local_index is not None
+            checks["local_index"] = {"ok": loaded, "required": True, "chunks": len(self.local_index) if loaded else 0}
+
+        if self.pool is not None:
+            start = time.perf_counter()
+            try:
+                async def ping():
+                    async with self.pool.connection(timeout=self.ready_check_timeout) as conn:
+                        await conn.execute("SELECT 1")
+
+                await asyncio.wait_for(ping(), self.ready_check_timeout)
+                checks["database"] = {"ok": True, "latency_ms": _elapsed_ms(start)}
+            except Exception as e:
+                print(f"[RAG] Database check failed ({type(e).__name__}: {e})", flush=True)
+                checks["database"] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            checks["database"]["required"] = self.retrieval_backend == "neon"
+
+        result = {
+            "ok": all(check["ok"] for check in checks.values() if check["required"]),
+            "checks": checks,
+        }
+        self._dependency_checks = result
+        self._dependency_checked_at = time.monotonic()
+        return result
+
+    async def get_stats(self) -> dict:
+        """Return chunk counts (cached, see _refresh_stats) plus query coalescing counters.
+
+        Only the first call waits for the database; afterwards a stale entry
+        is returned at once while a background task refreshes it.
+        """
+        if self._stats is None:
+            await self._stats_flight.do("stats", self._refresh_stats)
+        elif await self._stats_stale() and (self._stats_refresh is None or self._stats_refresh.done()):
+            self._stats_refresh = asyncio.ensure_future(self._stats_flight.do("stats", self._refresh_stats))
+            self._stats_refresh.add_done_callback(self._stats_refreshed)
+
+        return {
+            **self._stats,
+            "age_seconds": round(time.monotonic() - self._stats_refreshed_at, 1),
+            "coalescing": self._coalescing_stats(),
+        }
+
+    @staticmethod
+    def _stats_refreshed(task):
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            print(f"[RAG.stats] Background refresh failed ({type(e).__name__}: {e}), serving stale counts", flush=True)
+
+    async def _stats_stale(self) -> bool:
+        if time.monotonic() - self._stats_refreshed_at >= self.stats_ttl:
+            return True
+        return self.pool is not None and await self._get_corpus_version() != self._stats_version
+
+    async def _refresh_stats(self) -> dict:
+        """Count document_chunks: one grouped scan, or the planner estimate."""
+        if self.pool is None:
+            stats = self._local_stats()
+        else:
+            version = await self._get_corpus_version()
+            async with self.pool.connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    if self.stats_estimate:
+                        await cur.execute(STATS_ESTIMATE_SQL, prepare=self.prepare_statements)
+                        row = await cur.fetchone()
+                        # reltuples is -1 until the table has been vacuumed or analyzed
+                        stats = {"total_documents": max(row["total"], 0) if row else 0, "estimated": True}
+                    else:
+                        await cur.execute(STATS_SQL, prepare=self.prepare_statements)
+                        stats = self._group_stats(await cur.fetchall())
+            stats["database"] = "neon"
+            stats["corpus_version"] = self._stats_version = version
+
+        self._stats = stats
+        self._stats_refreshed_at = time.monotonic()
+        print(f"[RAG.stats] Refreshed: {stats['total_documents']} chunks", flush=True)
+        return stats
+
+    @staticmethod
+    def _group_stats(rows: list[dict]) -> dict:
+        stats = {"total_documents": 0, "estimated": False, "by_document": {}, "by_tax_type": {}, "by_embed_model": {}}
+        for row in rows:
+            if row["grouping_set"] == 0b111:
+                stats["total_documents"] = row["chunks"]
+            elif row["grouping_set"] in _STATS_BREAKDOWNS:
+                field, column = _STATS_BREAKDOWNS[row["grouping_set"]]
+                stats[field][row[column] or "unknown"] = row["chunks"]
+        return stats
+
+    def _local_stats(self) -> dict:
+        snapshot = self.local_index.snapshot
+        by_document = {}
+        for document_id in snapshot.meta["document_id"]:
+            by_document[document_id or "unknown"] = by_document.get(document_id or "unknown", 0) + 1
+        return {
+            "total_documents": len(snapshot),
+            "database": "local",
+            "estimated": False,
+            "by_document": by_document,
+            "by_embed_model": {snapshot.manifest.get("embed_model") or "unknown": len(snapshot)},
+        }
@@ -0,0 +1,79 @@
+import re
+
+# "notification 16/2017", "Notification No. 16/2017 - Central Tax", "16/2017-CT"
+_NOTIFICATION = re.compile(
+    r"\b(?:notification\s*(?:no\.?|number)?\s*[:#]?\s*)?"
+    r"(\d{1,3})\s*/\s*(\d{4})"
+    r"(?:\s*-?\s*(central|integrated|union\s+territory|state|compensation\s+cess)\s+tax"
+    r"(\s*\(\s*rate\s*\))?)?",
+    re.IGNORECASE,
+)
+
+# "section 9", "Section 16(4)", "sec. 2(52)"
+_SECTION = re.compile(r"\b(?:section|sec\.?|s\.)\s*(\d{1,3}[a-z]?)((?:\s*\(\s*\w{1,4}\s*\))*)", re.IGNORECASE)
+
+# The user wants the document text itself, not an answer about it.
+_TEXT_ONLY = re.compile(
+    r"^\s*(?:please\s+)?(?:show|display|print|fetch|get|open|give\s+me|read)\b"
+    r"|\b(?:full|complete|exact|entire)?\s*text\s+of\b"
+    r"|\bverbatim\b",
+    re.IGNORECASE,
+)
+
+# Words allowed around a reference for the question to still count as a pure
+# lookup. Anything else ("penalty", "turnover", ...) needs semantic search.
+# Statute qualifiers ("igst act", "cgst rules", "state") are not filler: the
+# lookups match a section or notification number across every statute, so
+# "section 9 of igst act" must go through search to reach the right one.
+_FILLER = frozenset(
+    """
+    a about an and as at can could details does explain for full complete entire exact
+    get give i in is it me notification no number of on open please print provides read
+    regarding say says show display fetch tell text the this under verbatim what whats
+    which sec section
+    """.split()
+)
+# Numbers count too: "16/2017 and 17/2017" must not route as a lookup of 16/2017 alone
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _is_pure_lookup(question: str, match: re.Match) -> bool:
+    rest = (question[: match.start()] + " " + question[match.end():]).lower()
+    return all(word in _FILLER for word in _WORD.findall(rest))
+
+
+def route_question(question: str) -> dict | None:
+    """Detect a notification or section lookup that needs no embedding.
+
+    Returns None for ordinary questions, otherwise:
+        {"kind": "notification", "values": ["16/2017 - Central Tax"], "prefix": False, "text_only": ...}
+        {"kind": "notification", "values": ["16/2017"], "prefix": True, ...}   tax type not given
+        {"kind": "section", "values": ["16(4)", "16"], "prefix": False, ...}   most specific first
+
+    Only questions that are nothing but the reference plus filler words
+    ("show notification 16/2017", "what does section 9 say") are routed.
+    """
+    match = _NOTIFICATION.search(question)
+    if match and _is_pure_lookup(question, match):
+        number = f"{int(match.group(1))}/{match.group(2)}"
+        route = {"kind": "notification", "values": [number], "prefix": True}
+        if match.group(3):
+            tax = " ".join(word.capitalize() for word in match.group(3).split())
+            rate = " (Rate)" if match.group(4) else ""
+            route = {"kind": "notification", "values": [f"{number} - {tax} Tax{rate}"], "prefix": False}
+        route["text_only"] = bool(_TEXT_ONLY.search(question))
+        return route
+
+    match = _SECTION.search(question)
+    if match and _is_pure_lookup(question, match):
+        base = match.group(1).upper() if match.group(1)[-1].isalpha() else match.group(1)
+        subsections = re.sub(r"\s+", "", match.group(2))
+        values = [base + subsections, base] if subsections else [base]
+        return {
+            "kind": "section",
+            "values": values,
+            "prefix": False,
+            "text_only": bool(_TEXT_ONLY.search(question)),
+        }
+
+    return None
@@ -0,0 +1,42 @@
+import copy
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is still running await that same task instead of starting
+    another, and everyone gets (a copy of) its result or its exception.
+    Because the task is shielded, a caller disconnecting does not cancel the
+    work the others are waiting on.
+    """
+
+    def __init__(self):
+        self._inflight: dict[object, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key, fn):
+        """Return the result of `await fn()`, sharing it with concurrent callers of `key`."""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.collapsed += 1
+            print(f"[SingleFlight] Joined in-flight call ({self.collapsed} collapsed so far)", flush=True)
+            return copy.deepcopy(await asyncio.shield(task))
+
+        self.executions += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight),
+        }
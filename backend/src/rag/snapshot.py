@@ -0,0 +1,195 @@
+"""Versioned on-disk snapshot of document_chunks: embeddings plus chunk metadata.
+
+A snapshot is a directory:
+
+    manifest.json        format, version, count, dim, dtype, embed_model
+    vectors.npy          (count, dim) float32 or float16 embedding matrix
+    norms.npy            (count,) float32 L2 norm of each vector
+    content.bin          UTF-8 chunk contents, concatenated
+    content_offsets.npy  (count + 1,) int64 byte offsets into content.bin
+    meta.json            columnar id, document_id, section_number, page_numbers, ...
+                         plus has_embedding (false rows hold a zero vector)
+
+Every .npy file and content.bin are memory-mapped on load, so opening a
+snapshot costs a few small reads no matter how large the corpus is.
+"""
+import os
+import json
+import mmap
+import shutil
+import time
+import numpy as np
+
+SNAPSHOT_FORMAT = "vedan-chunks"
+SNAPSHOT_VERSION = 1
+
+# Per-chunk metadata kept in meta.json, in document_chunks column order.
+META_COLUMNS = (
+    "id",
+    "document_id",
+    "chunk_index",
+    "total_chunks",
+    "section_number",
+    "page_numbers",
+    "tokens",
+    "created_at",
+)
+
+
+def parse_vector(value) -> np.ndarray | None:
+    """Coerce a list, array or pgvector/JSON string ("[0.1,0.2,...]") to float32."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def write_snapshot(path: str, chunks, dtype: str = "float32", embed_model: str | None = None) -> dict:
+    """Write chunks (a sized sequence of dicts with an `embedding`) to a snapshot directory.
+
+    Chunks without an embedding are kept (as a zero vector, flagged in the
+    has_embedding column) so a snapshot can back up every row. The snapshot
+    is built next to `path` and swapped into place at the end, so readers
+    never see a half-written directory. Returns the manifest.
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError("dtype must be float32 or float16")
+    if not chunks:
+        raise ValueError("Cannot write an empty snapshot")
+
+    count = len(chunks)
+    first = next((v for v in (parse_vector(c.get("embedding")) for c in chunks) if v is not None), None)
+    if first is None:
+        raise ValueError("Cannot write a snapshot in which no chunk has an embedding")
+    dim = len(first)
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_path, "vectors.npy"), mode="w+", dtype=dtype, shape=(count, dim)
+    )
+    norms = np.empty(count, dtype=np.float32)
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    meta = {column: [] for column in META_COLUMNS}
+    meta["has_embedding"] = []
+
+    with open(os.path.join(tmp_path, "content.bin"), "wb") as f:
+        for i, chunk in enumerate(chunks):
+            vector = parse_vector(chunk.get("embedding"))
+            if vector is None:
+                vectors[i] = 0
+                norms[i] = 0.0
+            elif vector.shape != (dim,):
+                raise ValueError(f"Chunk {chunk.get('id')} has a {vector.shape} embedding, expected ({dim},)")
+            else:
+                vectors[i] = vector
+                norms[i] = np.linalg.norm(vector)
+            meta["has_embedding"].append(vector is not None)
+
+            data = (chunk.get("content") or "").encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+
+            for column in META_COLUMNS:
+                meta[column].append(chunk.get(column))
+
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(tmp_path, "norms.npy"), norms)
+    np.save(os.path.join(tmp_path, "content_offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "count": count,
+        "dim": dim,
+        "dtype": dtype,
+        "embed_model": embed_model,
+        "missing_embeddings": meta["has_embedding"].count(False),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the finished snapshot into place
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return manifest
+
+
+class Snapshot:
+    """A memory-mapped, read-only view of a snapshot directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a {SNAPSHOT_FORMAT} snapshot")
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"{path} has snapshot version {self.manifest.get('version')}, expected {SNAPSHOT_VERSION}"
+            )
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self._offsets = np.load(os.path.join(path, "content_offsets.npy"), mmap_mode="r")
+
+        self._content_file = open(os.path.join(path, "content.bin"), "rb")
+        if self._offsets[-1] > 0:
+            self._content = mmap.mmap(self._content_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._content = b""
+
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ids = self.meta["id"]
+        # Snapshots written before has_embedding existed only held embedded chunks
+        self.has_embedding = np.asarray(self.meta.get("has_embedding") or [True] * len(self.ids), dtype=bool)
+
+    def __len__(self):
+        return self.manifest["count"]
+
+    @property
+    def dim(self) -> int:
+        return self.manifest["dim"]
+
+    def content(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._content[start:end].decode("utf-8")
+
+    def row(self, i: int, with_embedding: bool = False) -> dict:
+        """Return chunk i as a document_chunks-shaped dict."""
+        row = {column: self.meta[column][i] for column in META_COLUMNS}
+        row["page_numbers"] = row["page_numbers"] or []
+        row["content"] = self.content(i)
+        if with_embedding:
+            row["embedding"] = self.vectors[i].astype(np.float32) if self.has_embedding[i] else None
+        return row
+
+    def rows(self, with_embedding: bool = False):
+        """Iterate over every chunk without materializing the whole corpus."""
+        for i in range(len(self)):
+            yield self.row(i, with_embedding=with_embedding)
+
+    def close(self):
+        if isinstance(self._content, mmap.mmap):
+            self._content.close()
+        self._content_file.close()
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Open a snapshot directory, memory-mapping its arrays without copying."""
+    return Snapshot(path)
@@ -1,7 +1,7 @@
 import os
 import re
-import asyncio
-import requests
+import importlib.util
+import httpx
 from dotenv import load_dotenv
 from google import genai
 
@@ -27,6 +27,26 @@ class SupabaseRAGEngine:
             "Content-Type": "application/json",
         }
 
+        # One keep-alive connection pool shared by the RPC and PostgREST reads,
+        # so requests skip the TCP+TLS handshake. HTTP/2 multiplexes them over
+        # a single connection when the h2 package is installed (httpx[http2]).
+        # Per-call timeouts are full httpx.Timeout objects: a bare float would
+        # also replace the connect timeout
+        connect_timeout = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 5))
+        self.rpc_timeout = httpx.Timeout(float(os.getenv("SUPABASE_RPC_TIMEOUT", 30)), connect=connect_timeout)
+        self.read_timeout = httpx.Timeout(float(os.getenv("SUPABASE_READ_TIMEOUT", 10)), connect=connect_timeout)
+        self.http = httpx.AsyncClient(
+            base_url=self.rest_url,
+            headers=self.headers,
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", 20)),
+                max_keepalive_connections=int(os.getenv("SUPABASE_MAX_KEEPALIVE", 10)),
+                keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 60)),
+            ),
+            timeout=self.rpc_timeout,
+        )
+
         # --- Gemini Client ---
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
@@ -39,6 +59,10 @@ class SupabaseRAGEngine:
 
         print("Supabase RAG engine ready!", flush=True)
 
+    async def close(self):
+        """Close the pooled HTTP connections."""
+        await self.http.aclose()
+
     # --------------------------------------------------------------------- #
     #  Parse metadata from chunk content header
     # --------------------------------------------------------------------- #
@@ -93,15 +117,9 @@ class SupabaseRAGEngine:
         }
 
         print(f"[RAG._search] Calling Supabase RPC match_documents...", flush=True)
-        response = await asyncio.to_thread(
-            requests.post,
-            f"{self.supabase_url}/rest/v1/rpc/match_documents",
-            json=payload,
-            headers=self.headers,
-            timeout=30,
-        )
+        response = await self.http.post("/rpc/match_documents", json=payload, timeout=self.rpc_timeout)
 
-        print(f"[RAG._search] RPC status={response.status_code}", flush=True)
+        print(f"[RAG._search] RPC status={response.status_code} ({response.http_version})", flush=True)
         if response.status_code != 200:
             print(f"[RAG._search] RPC ERROR body: {response.text[:500]}", flush=True)
             raise RuntimeError(
@@ -201,11 +219,11 @@ Answer:"""
     # --------------------------------------------------------------------- #
     async def get_stats(self) -> dict:
         """Return a count of rows in document_chunks."""
-        resp = await asyncio.to_thread(
-            requests.get,
-            f"{self.rest_url}/document_chunks?select=id",
-            headers={**self.headers, "Prefer": "count=exact", "Range": "0-0"},
-            timeout=10,
+        resp = await self.http.get(
+            "/document_chunks",
+            params={"select": "id"},
+            headers={"Prefer": "count=exact", "Range": "0-0"},
+            timeout=self.read_timeout,
         )
         # The total count is in the Content-Range header, e.g. "0-0/3413"
         content_range = resp.headers.get("Content-Range", "")
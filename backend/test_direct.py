@@ -1,5 +1,5 @@
 """Direct test of the RAG engine — no FastAPI, no buffering issues."""
-import sys, os
+import sys, os, asyncio
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 
 from dotenv import load_dotenv
@@ -10,25 +10,39 @@ print("STEP 1: Importing NeonRAGEngine...", flush=True)
 from src.rag.neon_query_engine import NeonRAGEngine
 print("  OK", flush=True)
 
-print("=" * 60, flush=True)
-print("STEP 2: Creating engine instance...", flush=True)
-engine = NeonRAGEngine()
-print("  OK", flush=True)
 
-print("=" * 60, flush=True)
-print("STEP 3: Testing _search('What is GST?')...", flush=True)
-docs = engine._search("What is GST?", k=3)
-print(f"  OK — Got {len(docs)} docs", flush=True)
-if docs:
-    print(f"  First doc keys: {list(docs[0].keys())}", flush=True)
-    print(f"  First doc content[:100]: {docs[0].get('content', '')[:100]}", flush=True)
+async def main():
+    print("=" * 60, flush=True)
+    print("STEP 2: Creating engine instance...", flush=True)
+    engine = NeonRAGEngine()
+    await engine.open()
+    print("  OK", flush=True)
 
-print("=" * 60, flush=True)
-print("STEP 4: Testing full query('What is GST?')...", flush=True)
-result = engine.query("What is GST?", k=3)
-print(f"  OK — Answer length: {len(result['answer'])}", flush=True)
-print(f"  Sources: {len(result['sources'])}", flush=True)
-print(f"  Answer preview: {result['answer'][:200]}", flush=True)
+    print("=" * 60, flush=True)
+    print("STEP 3: Testing _search('What is GST?')...", flush=True)
+    docs = await engine._search("What is GST?", k=3)
+    print(f"  OK — Got {len(docs)} docs", flush=True)
+    if docs:
+        print(f"  First doc keys: {list(docs[0].keys())}", flush=True)
+        print(f"  First doc body[:100]: {docs[0].get('body', '')[:100]}", flush=True)
 
-print("=" * 60, flush=True)
-print("ALL STEPS PASSED!", flush=True)
+    print("=" * 60, flush=True)
+    print("STEP 3b: Testing hybrid _search('16/2017 - Central Tax')...", flush=True)
+    docs = await engine._search("16/2017 - Central Tax", k=3, retrieval="hybrid")
+    print(f"  OK — Got {len(docs)} docs", flush=True)
+    for doc in docs:
+        print(f"  {doc['notification_number']}  rrf={doc.get('rrf_score')}", flush=True)
+
+    print("=" * 60, flush=True)
+    print("STEP 4: Testing full query('What is GST?')...", flush=True)
+    result = await engine.query("What is GST?", k=3)
+    print(f"  OK — Answer length: {len(result['answer'])}", flush=True)
+    print(f"  Sources: {len(result['sources'])}", flush=True)
+    print(f"  Answer preview: {result['answer'][:200]}", flush=True)
+
+    print("=" * 60, flush=True)
+    print("ALL STEPS PASSED!", flush=True)
+    await engine.close()
+
+
+asyncio.run(main())
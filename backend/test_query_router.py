@@ -0,0 +1,43 @@
+"""Checks of the identifier router — no network, no database.
+
+Each question is routed with route_question() and compared with the lookup
+it should (or should not) become.
+
+Usage:
+    python test_query_router.py
+"""
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from src.rag.query_router import route_question
+
+# question -> expected (kind, values, text_only), or None when it needs search
+CASES = {
+    "show notification 16/2017 - Central Tax": ("notification", ["16/2017 - Central Tax"], True),
+    "what does notification no. 16/2017 say": ("notification", ["16/2017"], False),
+    "Section 16(4)": ("section", ["16(4)", "16"], False),
+    "what does section 9 say": ("section", ["9"], False),
+    # Several identifiers: routing to the first would drop the others
+    "show notification 16/2017 and 17/2017": None,
+    "section 16 and 17": None,
+    "section 16 of 2017": None,
+    # A statute qualifier narrows the lookup, which the router cannot do
+    "section 9 of igst act": None,
+    "cgst rules section 2": None,
+    # Anything beyond filler needs semantic search
+    "penalty under section 122": None,
+    "what is the GST rate on gold?": None,
+}
+
+
+def main():
+    for question, expected in CASES.items():
+        route = route_question(question)
+        got = None if route is None else (route["kind"], route["values"], route["text_only"])
+        assert got == expected, f"{question!r}: expected {expected}, got {got}"
+        print(f"  {question!r} -> {got}", flush=True)
+    print("QUERY ROUTER TEST PASSED!", flush=True)
+
+
+if __name__ == "__main__":
+    main()
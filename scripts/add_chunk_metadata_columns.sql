@@ -0,0 +1,53 @@
+-- ============================================================
+-- Precomputed chunk metadata for Vedan AI (Neon)
+-- Run this in the Neon SQL Editor, then run
+-- scripts/backfill_chunk_metadata.py to fill existing rows.
+-- ============================================================
+
+-- 1. Columns parsed once from the "Document: / Notification:" header of each
+--    chunk (see backend/src/rag/chunk_metadata.py). body_offset is the
+--    character offset of the body in content, so the header is not shipped
+--    back on every query. New rows get them from bulk_load.py.
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS title TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS notification_number TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS body_offset INTEGER;
+
+-- 2. match_documents returns the metadata columns and the body instead of the
+--    raw content. Rows not yet backfilled (title IS NULL) return the full
+--    content as body; the API parses those itself.
+--    The return type changes, so the old function has to be dropped first.
+DROP FUNCTION IF EXISTS match_documents(vector, int);
+
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding vector(768),
+    match_count int DEFAULT 10
+)
+RETURNS TABLE (
+    id uuid,
+    document_id text,
+    section_number text,
+    page_numbers int[],
+    title text,
+    notification_number text,
+    body text,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.section_number,
+        dc.page_numbers,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+        1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM document_chunks dc
+    ORDER BY dc.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
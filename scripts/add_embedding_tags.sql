@@ -0,0 +1,21 @@
+-- ============================================================
+-- Content-hash + embedding-model tags for incremental re-embedding
+-- Run this in the Neon (or Supabase) SQL Editor before running
+-- re_embed_gemini.py, upload_to_neon.py or reseed_database.py.
+-- ============================================================
+
+-- 1. Tag columns: sha256 of content (hex) and the model/dimension that
+--    produced the stored embedding. re_embed_gemini.py only re-embeds rows
+--    whose tags do not match the current content and model.
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embed_model TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embed_dim INTEGER;
+
+-- 2. (Optional, one-time) Adopt existing embeddings as current so the first
+--    incremental run does not re-embed the whole corpus. Only run this if the
+--    stored embeddings were produced by gemini-embedding-001 at 768 dims.
+-- UPDATE document_chunks
+-- SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex'),
+--     embed_model = 'gemini-embedding-001',
+--     embed_dim = 768
+-- WHERE content_hash IS NULL AND embedding IS NOT NULL;
@@ -0,0 +1,89 @@
+-- ============================================================
+-- Hybrid (full-text + vector) retrieval for Vedan AI (Neon)
+-- Run this in the Neon SQL Editor after add_chunk_metadata_columns.sql.
+-- ============================================================
+
+-- 1. Full-text index over chunk content. The column is generated, so every
+--    load path (bulk_load.py, re-embedding) keeps it current for free.
+--    The same parser runs over questions, so identifiers such as
+--    "16/2017-Central Tax" or "section 16(4)" tokenize identically on both sides.
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED;
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+    ON document_chunks USING gin (content_tsv);
+
+-- 2. match_documents_hybrid: top candidate_count chunks by vector distance and
+--    by full-text rank, merged with reciprocal rank fusion
+--    (score = sum of 1 / (rrf_k + rank) over both lists) in one round trip.
+--    Question terms are OR-ed so a chunk matching only the identifier still
+--    ranks; ts_rank_cd rewards chunks that match more terms close together.
+--    Returns the match_documents columns plus the fused score.
+CREATE OR REPLACE FUNCTION match_documents_hybrid(
+    query_embedding vector(768),
+    query_text text,
+    match_count int DEFAULT 10,
+    candidate_count int DEFAULT 50,
+    rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+    id uuid,
+    document_id text,
+    section_number text,
+    page_numbers int[],
+    title text,
+    notification_number text,
+    body text,
+    similarity float,
+    rrf_score float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH text_query AS (
+        -- plainto_tsquery: question text is never read as operators ("16/2017 - Central Tax"
+        -- must not become NOT 'central'), so its only operator is &, turned into |
+        SELECT replace(plainto_tsquery('english', query_text)::text, ' & ', ' | ')::tsquery AS q
+    ),
+    vector_hits AS (
+        SELECT v.id, row_number() OVER (ORDER BY v.distance) AS rank
+        FROM (
+            SELECT dc.id, dc.embedding <=> query_embedding AS distance
+            FROM document_chunks dc
+            ORDER BY dc.embedding <=> query_embedding
+            LIMIT candidate_count
+        ) v
+    ),
+    text_hits AS (
+        SELECT t.id, row_number() OVER (ORDER BY t.text_rank DESC) AS rank
+        FROM (
+            SELECT dc.id, ts_rank_cd(dc.content_tsv, tq.q) AS text_rank
+            FROM document_chunks dc, text_query tq
+            WHERE dc.content_tsv @@ tq.q
+            ORDER BY ts_rank_cd(dc.content_tsv, tq.q) DESC
+            LIMIT candidate_count
+        ) t
+    ),
+    fused AS (
+        SELECT COALESCE(vh.id, th.id) AS chunk_id,
+               COALESCE(1.0 / (rrf_k + vh.rank), 0) + COALESCE(1.0 / (rrf_k + th.rank), 0) AS score
+        FROM vector_hits vh
+        FULL OUTER JOIN text_hits th ON th.id = vh.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.section_number,
+        dc.page_numbers,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::float AS rrf_score
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.chunk_id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+END;
+$$;
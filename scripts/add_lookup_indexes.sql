@@ -0,0 +1,15 @@
+-- ============================================================
+-- Btree indexes for the API's identifier fast path
+-- (backend/src/rag/query_router.py). Run in the Neon SQL Editor.
+-- ============================================================
+
+-- Notification lookups match "16/2017 - Central Tax" exactly or "16/2017 %"
+-- by prefix; text_pattern_ops lets both use the index.
+CREATE INDEX IF NOT EXISTS documents_notification_number_idx
+    ON documents (notification_number text_pattern_ops);
+
+-- Chunks of a document in reading order, and chunks by section number.
+CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx
+    ON document_chunks (document_id, chunk_index);
+CREATE INDEX IF NOT EXISTS document_chunks_section_number_idx
+    ON document_chunks (section_number);
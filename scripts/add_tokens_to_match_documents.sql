@@ -0,0 +1,116 @@
+-- ============================================================
+-- Return each chunk's token count from match_documents and
+-- match_documents_hybrid, so the API can pack prompts to a token budget.
+-- Run in the Neon SQL Editor after add_hybrid_search.sql.
+-- The return types change, so both functions are dropped and recreated.
+-- ============================================================
+
+DROP FUNCTION IF EXISTS match_documents(vector, int);
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding vector(768),
+    match_count int DEFAULT 10
+)
+RETURNS TABLE (
+    id uuid,
+    document_id text,
+    section_number text,
+    page_numbers int[],
+    tokens int,
+    title text,
+    notification_number text,
+    body text,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.section_number,
+        dc.page_numbers,
+        dc.tokens,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+        1 - (dc.embedding <=> query_embedding) AS similarity
+    FROM document_chunks dc
+    ORDER BY dc.embedding <=> query_embedding
+    LIMIT match_count;
+END;
+$$;
+
+DROP FUNCTION IF EXISTS match_documents_hybrid(vector, text, int, int, int);
+CREATE OR REPLACE FUNCTION match_documents_hybrid(
+    query_embedding vector(768),
+    query_text text,
+    match_count int DEFAULT 10,
+    candidate_count int DEFAULT 50,
+    rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+    id uuid,
+    document_id text,
+    section_number text,
+    page_numbers int[],
+    tokens int,
+    title text,
+    notification_number text,
+    body text,
+    similarity float,
+    rrf_score float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH text_query AS (
+        -- plainto_tsquery: question text is never read as operators ("16/2017 - Central Tax"
+        -- must not become NOT 'central'), so its only operator is &, turned into |
+        SELECT replace(plainto_tsquery('english', query_text)::text, ' & ', ' | ')::tsquery AS q
+    ),
+    vector_hits AS (
+        SELECT v.id, row_number() OVER (ORDER BY v.distance) AS rank
+        FROM (
+            SELECT dc.id, dc.embedding <=> query_embedding AS distance
+            FROM document_chunks dc
+            ORDER BY dc.embedding <=> query_embedding
+            LIMIT candidate_count
+        ) v
+    ),
+    text_hits AS (
+        SELECT t.id, row_number() OVER (ORDER BY t.text_rank DESC) AS rank
+        FROM (
+            SELECT dc.id, ts_rank_cd(dc.content_tsv, tq.q) AS text_rank
+            FROM document_chunks dc, text_query tq
+            WHERE dc.content_tsv @@ tq.q
+            ORDER BY ts_rank_cd(dc.content_tsv, tq.q) DESC
+            LIMIT candidate_count
+        ) t
+    ),
+    fused AS (
+        SELECT COALESCE(vh.id, th.id) AS chunk_id,
+               COALESCE(1.0 / (rrf_k + vh.rank), 0) + COALESCE(1.0 / (rrf_k + th.rank), 0) AS score
+        FROM vector_hits vh
+        FULL OUTER JOIN text_hits th ON th.id = vh.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.section_number,
+        dc.page_numbers,
+        dc.tokens,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::float AS rrf_score
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.chunk_id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+END;
+$$;
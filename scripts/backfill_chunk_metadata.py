@@ -0,0 +1,98 @@
+"""
+Fill document_chunks.title / notification_number / body_offset from each
+chunk's content header, so the API no longer parses headers per query.
+
+Run scripts/add_chunk_metadata_columns.sql first. Rows are read and updated
+in batches (one UPDATE ... FROM unnest per batch), committing as it goes, so
+the script can be interrupted and re-run.
+
+Usage:
+    python scripts/backfill_chunk_metadata.py          # rows with no title yet
+    python scripts/backfill_chunk_metadata.py --all    # re-parse every row
+"""
+
+import os
+import sys
+import argparse
+import psycopg
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.chunk_metadata import parse_chunk_metadata
+
+load_dotenv("backend/.env")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL not set in backend/.env")
+    exit(1)
+
+BATCH_SIZE = 1000
+
+
+def fetch_batch(cur, after_id, only_missing):
+    """Next BATCH_SIZE (id, content) rows after `after_id`, in id order."""
+    cur.execute(
+        f"""SELECT id, content FROM document_chunks
+            WHERE (%s::uuid IS NULL OR id > %s::uuid)
+              {"AND title IS NULL" if only_missing else ""}
+            ORDER BY id
+            LIMIT %s""",
+        (after_id, after_id, BATCH_SIZE),
+    )
+    return cur.fetchall()
+
+
+def update_batch(cur, rows):
+    ids, titles, notifications, offsets = [], [], [], []
+    for chunk_id, content in rows:
+        meta = parse_chunk_metadata(content or "")
+        ids.append(chunk_id)
+        titles.append(meta["title"])
+        notifications.append(meta["notification"])
+        offsets.append(meta["body_offset"])
+
+    cur.execute(
+        """UPDATE document_chunks AS dc
+           SET title = u.title,
+               notification_number = u.notification_number,
+               body_offset = u.body_offset
+           FROM unnest(%s::uuid[], %s::text[], %s::text[], %s::int[])
+                AS u(id, title, notification_number, body_offset)
+           WHERE dc.id = u.id""",
+        (ids, titles, notifications, offsets),
+    )
+
+
+def backfill(only_missing: bool):
+    conn = psycopg.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT COUNT(*) FROM document_chunks {'WHERE title IS NULL' if only_missing else ''}"
+            )
+            total = cur.fetchone()[0]
+            print(f"{total} chunks to backfill.")
+
+            after_id = None
+            with tqdm(total=total, desc="Backfilling") as progress:
+                while True:
+                    rows = fetch_batch(cur, after_id, only_missing)
+                    if not rows:
+                        break
+                    update_batch(cur, rows)
+                    conn.commit()
+                    after_id = rows[-1][0]
+                    progress.update(len(rows))
+    finally:
+        conn.close()
+
+    print("Backfill complete.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--all", action="store_true", help="Re-parse every row, not just rows with no title")
+    args = parser.parse_args()
+    backfill(only_missing=not args.all)
@@ -0,0 +1,44 @@
+"""
+Parsers for the Supabase/Neon CSV backup formats, shared by the upload and
+snapshot scripts.
+"""
+
+import json
+import ast
+
+
+def parse_pg_array(val: str) -> list:
+    """Parse a PostgreSQL array literal like {1,2,3} or JSON [1,2,3] into a Python list."""
+    if not val or val.strip() in ("", "{}", "[]"):
+        return []
+    val = val.strip()
+    # Try JSON first (handles [1, 2, 3])
+    try:
+        parsed = json.loads(val)
+        if isinstance(parsed, list):
+            return [int(x) for x in parsed]
+    except (json.JSONDecodeError, ValueError):
+        pass
+    # Fallback: PostgreSQL array format {1,2,3}
+    val = val.strip("{}")
+    if not val:
+        return []
+    return [int(x) for x in val.split(",")]
+
+
+def parse_embedding(val: str) -> list:
+    """Parse embedding string — could be JSON array or PostgreSQL vector literal."""
+    if not val or val.strip() == "":
+        return None
+    val = val.strip()
+    # Handle PostgreSQL vector format: [0.1,0.2,...] or JSON array
+    try:
+        return json.loads(val)
+    except json.JSONDecodeError:
+        pass
+    # Try ast.literal_eval as fallback
+    try:
+        return ast.literal_eval(val)
+    except (ValueError, SyntaxError):
+        pass
+    return None
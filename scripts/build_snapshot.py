@@ -0,0 +1,78 @@
+"""
+Convert a JSON or CSV backup of document_chunks into a snapshot directory.
+
+Usage:
+    python scripts/build_snapshot.py full_backup.json corpus.snapshot
+    python scripts/build_snapshot.py embedded_chunks_gemini.json corpus.snapshot
+    python scripts/build_snapshot.py document_chunks_backup.csv corpus.snapshot --float16
+
+The snapshot (see backend/src/rag/snapshot.py) is the one local format read by
+the scripts and by the API's local vector index (LOCAL_INDEX_PATH).
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+
+from backup_formats import parse_pg_array, parse_embedding
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.snapshot import write_snapshot
+
+EMBED_MODEL = "gemini-embedding-001"
+
+
+def read_json_backup(path: str) -> list[dict]:
+    """Read full_backup.json / embedded_chunks_gemini.json (a JSON list of rows)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_csv_backup(path: str):
+    """Stream rows from document_chunks_backup.csv with typed columns."""
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield {
+                "id": row["id"],
+                "document_id": row.get("document_id") or None,
+                "chunk_index": int(row["chunk_index"]) if row.get("chunk_index") else None,
+                "total_chunks": int(row["total_chunks"]) if row.get("total_chunks") else None,
+                "section_number": row.get("section_number") or None,
+                "page_numbers": parse_pg_array(row.get("page_numbers", "")),
+                "tokens": int(row["tokens"]) if row.get("tokens") else None,
+                "created_at": row.get("created_at") or None,
+                "content": row.get("content", ""),
+                "embedding": parse_embedding(row.get("embedding", "")),
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="JSON or CSV backup of document_chunks")
+    parser.add_argument("output", help="Snapshot directory to write")
+    parser.add_argument("--float16", action="store_true", help="Store vectors as float16 (half the size)")
+    parser.add_argument("--embed-model", default=EMBED_MODEL, help="Embedding model recorded in the manifest")
+    args = parser.parse_args()
+
+    print(f"Reading {args.source}...")
+    if args.source.lower().endswith(".csv"):
+        rows = read_csv_backup(args.source)
+    else:
+        rows = read_json_backup(args.source)
+
+    chunks = [row for row in rows if row.get("embedding")]
+    print(f"  {len(chunks)} chunks with embeddings")
+
+    manifest = write_snapshot(
+        args.output,
+        chunks,
+        dtype="float16" if args.float16 else "float32",
+        embed_model=args.embed_model,
+    )
+    print(f"Wrote {args.output}: {manifest['count']} x {manifest['dim']} {manifest['dtype']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Bulk loader for document_chunks, shared by upload_to_neon.py and
+reseed_database.py.
+
+Rows are streamed with COPY into a temporary staging table, then swapped into
+the live table with DELETE + INSERT ... SELECT inside the same transaction.
+Readers keep seeing the old rows until the commit, so the live table is never
+empty mid-reseed, and a failure anywhere rolls the whole load back.
+"""
+
+import os
+import sys
+import time
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.chunk_metadata import parse_chunk_metadata
+
+CHUNK_COLUMNS = (
+    "id",
+    "document_id",
+    "chunk_index",
+    "total_chunks",
+    "section_number",
+    "content",
+    "embedding",
+    "tokens",
+    "page_numbers",
+    "content_hash",
+    "embed_model",
+    "embed_dim",
+    "title",
+    "notification_number",
+    "body_offset",
+    "created_at",
+)
+
+
+def content_hash(content: str | None) -> str:
+    """sha256 hex digest of a chunk's content; matches the SQL in add_embedding_tags.sql."""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def format_vector(embedding) -> str | None:
+    """Render a list/array of floats as a pgvector text literal."""
+    if embedding is None:
+        return None
+    if hasattr(embedding, "tolist"):
+        embedding = embedding.tolist()
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def _copy_values(row: dict) -> list:
+    """Order a row's values for COPY; the embedding becomes a pgvector literal,
+    and content_hash and the header metadata are always derived from the content."""
+    meta = parse_chunk_metadata(row.get("content") or "")
+    derived = {
+        "content_hash": content_hash(row.get("content")),
+        "title": meta["title"],
+        "notification_number": meta["notification"],
+        "body_offset": meta["body_offset"],
+    }
+    values = []
+    for column in CHUNK_COLUMNS:
+        if column == "embedding":
+            values.append(format_vector(row.get("embedding")))
+        elif column in derived:
+            values.append(derived[column])
+        else:
+            values.append(row.get(column))
+    return values
+
+
+def replace_chunks(conn, rows, progress=None) -> dict:
+    """Replace every row of document_chunks with `rows`, atomically.
+
+    `rows` is any iterable of dicts keyed by CHUNK_COLUMNS (embed_model and
+    embed_dim tag which model produced the embedding); it is consumed
+    once, so generators stream straight into COPY. `conn` is a psycopg (v3)
+    connection. Returns row count, timings and rows/sec.
+    """
+    columns = ", ".join(CHUNK_COLUMNS)
+    start = time.perf_counter()
+    copied = 0
+
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(
+                "CREATE TEMP TABLE document_chunks_staging "
+                "(LIKE document_chunks INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+
+            with cur.copy(f"COPY document_chunks_staging ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(_copy_values(row))
+                    copied += 1
+                    if progress is not None:
+                        progress.update(1)
+            copy_seconds = time.perf_counter() - start
+
+            # Swap: readers see the old rows until this transaction commits.
+            # An empty source never wipes the live table.
+            if copied:
+                cur.execute("DELETE FROM document_chunks")
+                cur.execute(
+                    f"INSERT INTO document_chunks ({columns}) "
+                    f"SELECT {columns} FROM document_chunks_staging"
+                )
+
+    total_seconds = time.perf_counter() - start
+    return {
+        "rows": copied,
+        "copy_seconds": round(copy_seconds, 2),
+        "total_seconds": round(total_seconds, 2),
+        "rows_per_sec": round(copied / total_seconds) if total_seconds else copied,
+    }
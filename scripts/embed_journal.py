@@ -0,0 +1,96 @@
+"""
+Append-only journal of re-embedded chunks, used by re_embed_gemini.py.
+
+Each bulk write appends one JSON line per chunk (id, metadata, embedding), so
+checkpointing costs O(batch) instead of rewriting the whole corpus. Appends
+are flushed immediately and fsync'd every `fsync_every` batches. After a
+crash, replay() rebuilds state from the journal, dropping a torn last line.
+compact() folds the journal into the local snapshot and empties it.
+"""
+
+import os
+import json
+
+from src.rag.snapshot import load_snapshot, write_snapshot
+
+
+class EmbeddingJournal:
+    def __init__(self, path: str, fsync_every: int = 5):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._unsynced = 0
+        self._repair()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _repair(self):
+        """Truncate a torn trailing record so new appends start on a clean line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                print(f"  Journal: dropped a partial record at the end of {self.path}")
+
+    def replay(self) -> dict:
+        """Return {id: record} for every journaled chunk; later records win."""
+        records = {}
+        self._file.flush()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["id"]] = record
+        return records
+
+    def append(self, records):
+        """Append one batch of records."""
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            self._file.write("\n")
+        self._file.flush()
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def reset(self):
+        """Empty the journal (after its records are safely in a snapshot)."""
+        self._file.close()
+        self._file = open(self.path, "w", encoding="utf-8")
+        self.sync()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+def compact(journal: EmbeddingJournal, snapshot_path: str, embed_model: str) -> int:
+    """Merge the journal into the snapshot at `snapshot_path`, then empty the journal.
+
+    Journal records replace snapshot rows with the same id. Returns the number
+    of chunks in the snapshot afterwards.
+    """
+    records = journal.replay()
+
+    rows = []
+    if os.path.exists(snapshot_path):
+        snapshot = load_snapshot(snapshot_path)
+        if not records:
+            count = len(snapshot)
+            snapshot.close()
+            return count
+        rows = [row for row in snapshot.rows(with_embedding=True) if row["id"] not in records]
+        snapshot.close()
+    elif not records:
+        return 0
+    rows.extend(records.values())
+
+    write_snapshot(snapshot_path, rows, embed_model=embed_model)
+    journal.reset()
+    return len(rows)
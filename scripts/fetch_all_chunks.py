@@ -1,9 +1,12 @@
 import os
-import json
+import sys
 import time
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.snapshot import write_snapshot
+
 load_dotenv("backend/.env")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -44,9 +47,12 @@ def fetch_all_chunks():
 
     print(f"Finished! Total chunks fetched: {len(all_chunks)}")
     
-    output_file = "full_backup.json"
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+    output_file = "full_backup.snapshot"
+    # Every row is kept; chunks with no embedding are flagged, not dropped,
+    # so reseeding from this backup does not delete them
+    manifest = write_snapshot(output_file, all_chunks, embed_model="gemini-embedding-001")
+    if manifest["missing_embeddings"]:
+        print(f"{manifest['missing_embeddings']} chunks have no embedding (kept without one)")
     
     print(f"Saved to {output_file}")
 
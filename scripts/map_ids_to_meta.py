@@ -1,8 +1,13 @@
 """Map document_id UUIDs to metadata title/filename using content headers."""
+import os
+import sys
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.snapshot import load_snapshot
+
 # Load chunks
-chunks = json.load(open('full_backup.json', encoding='utf-8'))
+chunks = load_snapshot('full_backup.snapshot').rows()
 
 # Build: document_id -> content title
 id_to_title = {}
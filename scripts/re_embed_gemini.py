@@ -2,36 +2,58 @@
 Re-embed all document_chunks in Supabase using Gemini Embedding API.
 
 Usage:
-    python re_embed_gemini.py
+    python re_embed_gemini.py [--write-to supabase|postgres]
 
 Features:
     - Uses gemini-embedding-001 with 768 dimensions
-    - Batches of 100 for API calls
-    - Checkpoint file to resume on crash
-    - Saves embeddings locally to embedded_chunks_gemini.json
-    - Updates Supabase directly
+    - Several embed batches in flight at once (EMBED_CONCURRENCY)
+    - Token-bucket limiter tuned to the per-minute quota (EMBED_RPM / EMBED_TPM)
+    - Adaptive backoff on 429s: honours the server's retryDelay and halves the
+      request rate, then ramps back up while calls succeed
+    - Bulk writes: one PostgREST upsert per write batch through a pooled
+      session, or one UPDATE ... FROM unnest(...) over DATABASE_URL
+    - Incremental: each chunk carries a content hash and embedding-model/dim
+      tag (see add_embedding_tags.sql); only new or changed chunks are embedded
+    - Append-only journal (embedded_chunks_gemini.journal.jsonl) to resume on
+      crash; checkpointing costs O(batch), not O(corpus)
+    - Compacts the journal into embedded_chunks_gemini.snapshot at the end of
+      every run (or on demand with --compact)
 """
 
 import os
-import json
+import re
+import sys
 import time
+import random
+import asyncio
+import argparse
 import requests
 from dotenv import load_dotenv
 from google import genai
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from embed_journal import EmbeddingJournal, compact
+from bulk_load import content_hash
+
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", "backend", ".env"), override=True)
 
 # ── Config ──────────────────────────────────────────────────────
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+DATABASE_URL = os.getenv("DATABASE_URL")
 
 EMBED_MODEL = "gemini-embedding-001"
 EMBED_DIM = 768
 BATCH_SIZE = 20
-CHECKPOINT_FILE = "reembed_checkpoint.json"
-LOCAL_EMBEDDINGS_FILE = "embedded_chunks_gemini.json"
+CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+REQUESTS_PER_MINUTE = float(os.getenv("EMBED_RPM", 100))
+TOKENS_PER_MINUTE = float(os.getenv("EMBED_TPM", 30000))
+WRITE_BATCH_SIZE = 200
+MAX_RETRIES = 8
+LOCAL_EMBEDDINGS_FILE = "embedded_chunks_gemini.snapshot"
+JOURNAL_FILE = "embedded_chunks_gemini.journal.jsonl"
 
 HEADERS = {
     "apikey": SUPABASE_KEY,
@@ -40,120 +62,368 @@ HEADERS = {
     "Prefer": "return=minimal",
 }
 
+# One keep-alive connection pool for every Supabase call
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=CONCURRENCY + 2))
+
+
+class DailyQuotaExceeded(Exception):
+    """The Gemini per-day quota is used up; resume tomorrow."""
+
+
+# ── Rate limiting ───────────────────────────────────────────────
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.max_rate = rate_per_minute
+        self.rate = rate_per_minute
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 10)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate / 60)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) * 60 / self.rate)
+
+    def slow_down(self):
+        """Multiplicative decrease after a 429."""
+        self._refill()
+        self.rate = max(self.max_rate / 20, self.rate / 2)
+
+    def speed_up(self):
+        """Additive increase after a success, up to the configured rate."""
+        self._refill()
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def estimate_tokens(texts) -> int:
+    """Rough token count (4 chars per token) for the TPM bucket."""
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+def retry_delay_seconds(error_str: str) -> float | None:
+    """Extract the server-suggested retryDelay (e.g. "retryDelay": "27s") from a 429."""
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", error_str)
+    return float(match.group(1)) if match else None
+
+
 # ── Helpers ──────────────────────────────────────────────────────
 
 def fetch_all_chunks():
-    """Fetch all chunk IDs, content and metadata from Supabase (paginated)."""
-    all_chunks = []
+    """Fetch all chunk IDs, content and metadata from Supabase (paginated).
+
+    Each chunk gets has_embedding, from a second id-only pass over the rows
+    whose embedding is NULL (the vectors themselves are not fetched).
+    """
+    all_chunks = fetch_pages(
+        "select=id,content,document_id,section_number,page_numbers,content_hash,embed_model,embed_dim"
+    )
+    missing = {row["id"] for row in fetch_pages("select=id&embedding=is.null")}
+    for chunk in all_chunks:
+        chunk["has_embedding"] = chunk["id"] not in missing
+    if missing:
+        print(f"  {len(missing)} chunks have no embedding")
+    return all_chunks
+
+
+def fetch_pages(query: str) -> list[dict]:
+    """Every document_chunks row matching a PostgREST query string, in id order."""
+    rows = []
     offset = 0
     page_size = 1000
 
     while True:
         url = (
             f"{SUPABASE_URL}/rest/v1/document_chunks"
-            f"?select=id,content,document_id,section_number,page_numbers"
+            f"?{query}"
             f"&order=id.asc"
             f"&offset={offset}&limit={page_size}"
         )
-        resp = requests.get(url, headers=HEADERS, timeout=30)
+        resp = session.get(url, timeout=30)
         if resp.status_code != 200:
             raise RuntimeError(f"Supabase fetch error {resp.status_code}: {resp.text[:300]}")
 
         page = resp.json()
         if not page:
             break
-        all_chunks.extend(page)
+        rows.extend(page)
         offset += page_size
-        print(f"  Fetched {len(all_chunks)} chunks so far...")
-
-    return all_chunks
-
-
-def load_checkpoint():
-    """Load checkpoint of already-processed IDs."""
-    if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, "r") as f:
-            data = json.load(f)
-        print(f"  Resuming from checkpoint: {len(data['processed_ids'])} already done.")
-        return set(data["processed_ids"])
-    return set()
-
-
-def save_checkpoint(processed_ids):
-    """Save checkpoint to disk."""
-    with open(CHECKPOINT_FILE, "w") as f:
-        json.dump({"processed_ids": list(processed_ids)}, f)
-
-
-def load_local_embeddings():
-    """Load existing local embeddings file."""
-    if os.path.exists(LOCAL_EMBEDDINGS_FILE):
-        with open(LOCAL_EMBEDDINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
-
-def save_local_embeddings(data):
-    """Save embeddings to local JSON file."""
-    with open(LOCAL_EMBEDDINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-
-def embed_texts(client, texts, max_retries=5):
-    """Embed a batch of texts using Gemini embedding API with 768 dimensions."""
-    for attempt in range(max_retries):
+        print(f"  Fetched {len(rows)} rows so far...")
+
+    return rows
+
+
+def plan_work(chunks):
+    """Return (chunks to embed, reason counts) by diffing each chunk's stored tags.
+
+    A chunk is current when it has an embedding, its stored content_hash
+    matches its content and its embed_model/embed_dim match EMBED_MODEL/EMBED_DIM. Each chunk's
+    content_hash is updated in place so it is written back with the new vector.
+    """
+    todo = []
+    counts = {"unchanged": 0, "new": 0, "content_changed": 0, "model_changed": 0}
+    for chunk in chunks:
+        current_hash = content_hash(chunk["content"])
+        stored_hash = chunk.get("content_hash")
+        chunk["content_hash"] = current_hash
+
+        if stored_hash is None or not chunk.get("has_embedding", True):
+            counts["new"] += 1
+        elif stored_hash != current_hash:
+            counts["content_changed"] += 1
+        elif chunk.get("embed_model") != EMBED_MODEL or chunk.get("embed_dim") != EMBED_DIM:
+            counts["model_changed"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        todo.append(chunk)
+    return todo, counts
+
+
+async def embed_texts(client, texts, requests_bucket, tokens_bucket, stats):
+    """Embed a batch of texts using Gemini embedding API with 768 dimensions.
+
+    Waits on both rate buckets before each call. On a per-minute 429 it halves
+    the request rate and sleeps for the server's retryDelay (or an exponential
+    backoff with jitter); on a per-day 429 it raises DailyQuotaExceeded.
+    """
+    for attempt in range(MAX_RETRIES):
+        await requests_bucket.acquire()
+        await tokens_bucket.acquire(estimate_tokens(texts))
         try:
-            result = client.models.embed_content(
+            result = await client.aio.models.embed_content(
                 model=EMBED_MODEL,
                 contents=texts,
                 config={
                     "output_dimensionality": EMBED_DIM,
                 },
             )
+            requests_bucket.speed_up()
             return [e.values for e in result.embeddings]
         except Exception as e:
             error_str = str(e)
+            backoff = min(60, 2 ** attempt) + random.uniform(0, 1)
             if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
                 if "PerDay" in error_str:
-                    print(f"\n  [WARNING] Daily quota reached! Progress has been saved.")
-                    print(f"  Run this script again later to resume.")
-                    return None
-                # Per-minute rate limit — wait and retry
-                wait_time = 30 * (attempt + 1)
-                print(f"\n  Rate limited. Waiting {wait_time}s before retry {attempt+1}/{max_retries}...")
-                time.sleep(wait_time)
+                    raise DailyQuotaExceeded(error_str)
+                stats["rate_limited"] += 1
+                requests_bucket.slow_down()
+                wait_time = retry_delay_seconds(error_str) or backoff
+                tqdm.write(
+                    f"  Rate limited. Waiting {wait_time:.1f}s, "
+                    f"rate now {requests_bucket.rate:.0f} req/min (retry {attempt+1}/{MAX_RETRIES})"
+                )
+                await asyncio.sleep(wait_time)
                 continue
-            print(f"\n  Embedding API error: {e}")
-            if attempt < max_retries - 1:
-                print(f"  Retrying in 15 seconds...")
-                time.sleep(15)
+            tqdm.write(f"  Embedding API error: {e}")
+            if attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(backoff)
                 continue
             raise
-    print(f"\n  [WARNING] Max retries reached. Progress has been saved.")
-    return None
+    raise RuntimeError(f"Embedding failed after {MAX_RETRIES} retries")
 
 
-def update_embedding(chunk_id, embedding):
-    """Update a single row's embedding in Supabase."""
-    url = f"{SUPABASE_URL}/rest/v1/document_chunks?id=eq.{chunk_id}"
-    payload = {"embedding": embedding}
-    resp = requests.patch(url, json=payload, headers=HEADERS, timeout=30)
-    if resp.status_code not in (200, 204):
-        raise RuntimeError(f"Supabase update error for id={chunk_id}: {resp.status_code} {resp.text[:200]}")
+# ── Bulk writers ────────────────────────────────────────────────
+
+class SupabaseWriter:
+    """Bulk-upserts embeddings and their tags through PostgREST, one request per write batch."""
+
+    def write(self, rows):
+        resp = session.post(
+            f"{SUPABASE_URL}/rest/v1/document_chunks?on_conflict=id",
+            json=rows,
+            headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+            timeout=60,
+        )
+        if resp.status_code not in (200, 201, 204):
+            raise RuntimeError(f"Supabase bulk upsert error: {resp.status_code} {resp.text[:200]}")
+
+    def close(self):
+        session.close()
+
+
+class PostgresWriter:
+    """Bulk-updates embeddings and their tags over a direct connection, one statement per write batch."""
+
+    def __init__(self, database_url):
+        import psycopg
+
+        self.conn = psycopg.connect(database_url)
+
+    def write(self, rows):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """UPDATE document_chunks AS dc
+                   SET embedding = u.embedding::vector,
+                       content_hash = u.content_hash,
+                       embed_model = %s,
+                       embed_dim = %s
+                   FROM unnest(%s::uuid[], %s::text[], %s::text[]) AS u(id, embedding, content_hash)
+                   WHERE dc.id = u.id""",
+                (
+                    EMBED_MODEL,
+                    EMBED_DIM,
+                    [row["id"] for row in rows],
+                    ["[" + ",".join(map(str, row["embedding"])) + "]" for row in rows],
+                    [row["content_hash"] for row in rows],
+                ),
+            )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# ── Pipeline ────────────────────────────────────────────────────
+
+async def run_pipeline(client, remaining, writer, journal, processed_ids, stats):
+    """Embed `remaining` with CONCURRENCY workers and bulk-write the results.
+
+    Returns False if the daily quota stopped the run early.
+    """
+    requests_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+    tokens_bucket = TokenBucket(TOKENS_PER_MINUTE, capacity=TOKENS_PER_MINUTE)
+    batches = asyncio.Queue()
+    for i in range(0, len(remaining), BATCH_SIZE):
+        batches.put_nowait(remaining[i : i + BATCH_SIZE])
+    # Bounded, so a slow writer holds embedding back instead of buffering vectors
+    results = asyncio.Queue(maxsize=CONCURRENCY * 2)
+    stop = asyncio.Event()
+    progress = tqdm(total=len(remaining), desc="Chunks")
+
+    async def embed_worker():
+        while not stop.is_set():
+            try:
+                batch = batches.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                embeddings = await embed_texts(
+                    client, [c["content"] for c in batch], requests_bucket, tokens_bucket, stats
+                )
+            except DailyQuotaExceeded:
+                tqdm.write("\n  [WARNING] Daily quota reached! Progress has been saved.")
+                tqdm.write("  Run this script again later to resume.")
+                stop.set()
+                return
+            await results.put(list(zip(batch, embeddings)))
+
+    def flush(pending):
+        writer.write(
+            [
+                {
+                    "id": chunk["id"],
+                    "embedding": emb,
+                    "content_hash": chunk["content_hash"],
+                    "embed_model": EMBED_MODEL,
+                    "embed_dim": EMBED_DIM,
+                }
+                for chunk, emb in pending
+            ]
+        )
+
+        # Journal the batch (with metadata) once it is safely in the database
+        journal.append(
+            {
+                "id": chunk["id"],
+                "content": chunk["content"],
+                "document_id": chunk.get("document_id", ""),
+                "section_number": chunk.get("section_number", ""),
+                "page_numbers": chunk.get("page_numbers", []),
+                "content_hash": chunk["content_hash"],
+                "embed_model": EMBED_MODEL,
+                "embed_dim": EMBED_DIM,
+                "embedding": emb,
+            }
+            for chunk, emb in pending
+        )
+        processed_ids.update(chunk["id"] for chunk, _ in pending)
+        stats["writes"] += 1
+
+    async def write_worker():
+        pending, item = [], ()
+        try:
+            while True:
+                item = await results.get()
+                if item is not None:
+                    pending.extend(item)
+                    progress.update(len(item))
+                if pending and (item is None or len(pending) >= WRITE_BATCH_SIZE):
+                    await asyncio.to_thread(flush, pending)
+                    pending = []
+                if item is None:
+                    return
+        except Exception as e:
+            # Stop embedding: nothing could be saved. Batches already in
+            # flight are drained (and lost) so their workers can finish.
+            tqdm.write(f"\n  [ERROR] Write failed, stopping: {e}")
+            stop.set()
+            while item is not None:
+                item = await results.get()
+            raise
+
+    writer_task = asyncio.create_task(write_worker())
+    try:
+        await asyncio.gather(*(embed_worker() for _ in range(CONCURRENCY)))
+    finally:
+        await results.put(None)
+        await writer_task
+        progress.close()
+    return not stop.is_set()
 
 
 # ── Main ────────────────────────────────────────────────────────
 
 def main():
+    parser = argparse.ArgumentParser(description="Re-embed document_chunks with Gemini.")
+    parser.add_argument(
+        "--write-to",
+        choices=("supabase", "postgres"),
+        default="supabase",
+        help="Write embeddings back via the Supabase REST API or directly over DATABASE_URL",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help=f"Only fold {JOURNAL_FILE} into {LOCAL_EMBEDDINGS_FILE} and exit",
+    )
+    args = parser.parse_args()
+
+    journal = EmbeddingJournal(JOURNAL_FILE)
+    if args.compact:
+        total = compact(journal, LOCAL_EMBEDDINGS_FILE, EMBED_MODEL)
+        journal.close()
+        print(f"Compacted journal into {LOCAL_EMBEDDINGS_FILE} ({total} entries)")
+        return
+
     print("=" * 60)
     print("Gemini Re-Embedding Script")
     print(f"Model: {EMBED_MODEL} | Dimensions: {EMBED_DIM} | Batch: {BATCH_SIZE}")
+    print(f"Concurrency: {CONCURRENCY} | Limits: {REQUESTS_PER_MINUTE:.0f} req/min, {TOKENS_PER_MINUTE:.0f} tokens/min")
     print("=" * 60)
 
     # Validate env
     if not all([SUPABASE_URL, SUPABASE_KEY, GOOGLE_API_KEY]):
         print("ERROR: Missing environment variables. Check .env file.")
         return
+    if args.write_to == "postgres" and not DATABASE_URL:
+        print("ERROR: --write-to postgres needs DATABASE_URL. Check .env file.")
+        return
 
     # Init Gemini client
     client = genai.Client(api_key=GOOGLE_API_KEY)
@@ -163,72 +433,53 @@ def main():
     chunks = fetch_all_chunks()
     print(f"  Total chunks: {len(chunks)}")
 
-    # Load checkpoint
-    print("\n[2/4] Checking for existing checkpoint...")
-    processed_ids = load_checkpoint()
+    # Diff content hashes + model tags against the stored ones
+    print("\n[2/4] Detecting new and changed chunks...")
+    remaining, counts = plan_work(chunks)
+    skipped_pct = 100 * counts["unchanged"] / len(chunks) if chunks else 0
+    print(f"  Unchanged (skipped): {counts['unchanged']} ({skipped_pct:.1f}% of corpus)")
+    print(f"  New: {counts['new']} | Content changed: {counts['content_changed']} | Model/dim changed: {counts['model_changed']}")
 
-    # Load local embeddings file
-    print("\n[3/4] Loading local embeddings file...")
-    local_embeddings = load_local_embeddings()
-    local_ids = {item["id"] for item in local_embeddings}
-    print(f"  Local file has {len(local_embeddings)} entries.")
-
-    # Filter out already-processed chunks
-    remaining = [c for c in chunks if c["id"] not in processed_ids]
+    print("\n[3/4] Checking local journal...")
+    print(f"  {JOURNAL_FILE}: {len(journal.replay())} entries pending compaction")
     print(f"  Remaining to process: {len(remaining)}")
 
     if not remaining:
-        print("\n  All chunks already processed! Nothing to do.")
+        total = compact(journal, LOCAL_EMBEDDINGS_FILE, EMBED_MODEL)
+        journal.close()
+        if total:
+            print(f"  Compacted journal into {LOCAL_EMBEDDINGS_FILE} ({total} entries)")
+        print("\n  All chunks are up to date! Nothing to do.")
         return
 
-    # Process in batches
+    # Process in concurrent batches
     print(f"\n[4/4] Re-embedding {len(remaining)} chunks...")
-    total_batches = (len(remaining) + BATCH_SIZE - 1) // BATCH_SIZE
-
-    for batch_idx in tqdm(range(0, len(remaining), BATCH_SIZE), total=total_batches, desc="Batches"):
-        batch = remaining[batch_idx : batch_idx + BATCH_SIZE]
-        texts = [c["content"] for c in batch]
-
-        # Get embeddings from Gemini
-        embeddings = embed_texts(client, texts)
-
-        # If rate-limited, save and exit
-        if embeddings is None:
-            save_checkpoint(processed_ids)
-            save_local_embeddings(local_embeddings)
-            print(f"\n  Progress saved: {len(processed_ids)}/{len(chunks)} chunks done.")
-            print(f"  Remaining: {len(chunks) - len(processed_ids)} chunks.")
-            print(f"  Local file: {LOCAL_EMBEDDINGS_FILE} ({len(local_embeddings)} entries)")
-            return
-
-        # Update each row in Supabase + save locally
-        for chunk, emb in zip(batch, embeddings):
-            update_embedding(chunk["id"], emb)
-            processed_ids.add(chunk["id"])
-
-            # Add to local file (with metadata)
-            if chunk["id"] not in local_ids:
-                local_embeddings.append({
-                    "id": chunk["id"],
-                    "content": chunk["content"],
-                    "document_id": chunk.get("document_id", ""),
-                    "section_number": chunk.get("section_number", ""),
-                    "page_numbers": chunk.get("page_numbers", []),
-                    "embedding": emb,
-                })
-                local_ids.add(chunk["id"])
-
-        # Save checkpoint + local file after every batch
-        save_checkpoint(processed_ids)
-        save_local_embeddings(local_embeddings)
-
-        # Small delay to avoid rate limits
-        time.sleep(5)
+    writer = PostgresWriter(DATABASE_URL) if args.write_to == "postgres" else SupabaseWriter()
+    stats = {"rate_limited": 0, "writes": 0}
+    processed_ids = set()
+    start = time.perf_counter()
+    try:
+        finished = asyncio.run(run_pipeline(client, remaining, writer, journal, processed_ids, stats))
+    finally:
+        writer.close()
+        journal.sync()
+    elapsed = time.perf_counter() - start
+
+    local_total = compact(journal, LOCAL_EMBEDDINGS_FILE, EMBED_MODEL)
+    journal.close()
+
+    if not finished:
+        print(f"\n  Progress saved: {len(processed_ids)}/{len(remaining)} chunks done this run.")
+        print(f"  Remaining: {len(remaining) - len(processed_ids)} chunks.")
+        print(f"  Local file: {LOCAL_EMBEDDINGS_FILE} ({local_total} entries)")
+        return
 
     print("\n" + "=" * 60)
-    print(f"Done! Re-embedded {len(processed_ids)} chunks with {EMBED_MODEL}.")
+    print(f"Done! Re-embedded {len(processed_ids)} chunks with {EMBED_MODEL}, skipped {counts['unchanged']} unchanged.")
     print(f"Dimensions: {EMBED_DIM}")
-    print(f"Local file: {LOCAL_EMBEDDINGS_FILE} ({len(local_embeddings)} entries)")
+    print(f"Throughput: {len(remaining) / elapsed * 60:.0f} chunks/min over {elapsed:.0f}s")
+    print(f"Rate-limited calls: {stats['rate_limited']} | Bulk writes: {stats['writes']}")
+    print(f"Local file: {LOCAL_EMBEDDINGS_FILE} ({local_total} entries)")
     print("=" * 60)
 
 
@@ -1,16 +1,25 @@
 """
-Reseed the Neon PostgreSQL database from the local full_backup.json file.
+Reseed the Neon PostgreSQL database from the local full_backup.snapshot.
+
+Chunks are streamed with COPY into a staging table and swapped into
+document_chunks in one transaction (see bulk_load.py), so there is no
+window in which the live table is empty.
 
 Usage:
     python scripts/reseed_database.py
 """
 
 import os
-import json
-import psycopg2
+import sys
+import psycopg
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from bulk_load import replace_chunks
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from src.rag.snapshot import load_snapshot
+
 load_dotenv("backend/.env")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -18,7 +27,20 @@ if not DATABASE_URL:
     print("Error: DATABASE_URL not set in backend/.env")
     exit(1)
 
-BACKUP_FILE = "full_backup.json"
+BACKUP_FILE = "full_backup.snapshot"
+
+
+def tagged_rows(snapshot):
+    """Snapshot rows tagged with the embedding model recorded in its manifest.
+
+    Rows backed up without an embedding stay untagged, so re_embed_gemini.py
+    still sees them as needing one.
+    """
+    for row in snapshot.rows(with_embedding=True):
+        if row["embedding"] is not None:
+            row["embed_model"] = snapshot.manifest.get("embed_model")
+            row["embed_dim"] = snapshot.dim
+        yield row
 
 
 def reseed_database():
@@ -27,58 +49,29 @@ def reseed_database():
         exit(1)
 
     print(f"Loading backup from {BACKUP_FILE}...")
-    with open(BACKUP_FILE, "r", encoding="utf-8") as f:
-        chunks = json.load(f)
-
-    total_chunks = len(chunks)
-    print(f"Loaded {total_chunks} chunks.")
-
-    print("\nWARNING: This process will re-upload data to 'document_chunks'.")
-    truncated = input("Did you already TRUNCATE the table manually? (yes/no): ").lower()
-
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
-
-    if truncated == "yes":
-        print("Skipping deletion step. Proceeding to upload...")
-    else:
-        print("Deleting existing data...")
-        cur.execute("DELETE FROM document_chunks")
-        conn.commit()
-        print("Deletion complete. Starting re-upload...")
-
-    # Re-upload in batches
-    BATCH_SIZE = 100
-    for i in tqdm(range(0, total_chunks, BATCH_SIZE), desc="Uploading Chunks"):
-        batch = chunks[i : i + BATCH_SIZE]
-        for chunk in batch:
-            embedding = chunk.get("embedding")
-            page_numbers = chunk.get("page_numbers", [])
-
-            cur.execute(
-                """INSERT INTO document_chunks
-                   (id, document_id, chunk_index, total_chunks, section_number,
-                    content, embedding, tokens, page_numbers, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s::vector, %s, %s, %s)""",
-                (
-                    chunk["id"],
-                    chunk.get("document_id"),
-                    chunk.get("chunk_index"),
-                    chunk.get("total_chunks"),
-                    chunk.get("section_number"),
-                    chunk.get("content"),
-                    str(embedding) if embedding else None,
-                    chunk.get("tokens"),
-                    page_numbers if page_numbers else [],
-                    chunk.get("created_at"),
-                ),
-            )
-        conn.commit()
-
-    cur.close()
-    conn.close()
-    print("\nReseed Complete! Database should be clean and consistent now.")
-
+    snapshot = load_snapshot(BACKUP_FILE)
+
+    total_chunks = len(snapshot)
+    print(f"Loaded {total_chunks} chunks ({snapshot.manifest.get('missing_embeddings', 0)} without an embedding).")
+
+    print("\nWARNING: This process will replace all rows in 'document_chunks'.")
+    print("The live table keeps serving the old rows until the new ones are committed.")
+    confirm = input("Continue? (yes/no): ").lower()
+    if confirm != "yes":
+        print("Aborted.")
+        return
+
+    conn = psycopg.connect(DATABASE_URL)
+    try:
+        with tqdm(total=total_chunks, desc="Uploading Chunks") as progress:
+            result = replace_chunks(conn, tagged_rows(snapshot), progress=progress)
+    finally:
+        conn.close()
+
+    print(
+        f"\nReseed Complete! Loaded {result['rows']} chunks in {result['total_seconds']}s "
+        f"({result['rows_per_sec']} rows/sec, COPY {result['copy_seconds']}s)."
+    )
 
 if __name__ == "__main__":
     reseed_database()
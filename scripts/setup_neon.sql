@@ -38,20 +38,32 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     embedding vector(768),
     tokens INTEGER,
     page_numbers INTEGER[],
+    content_hash TEXT,
+    embed_model TEXT,
+    embed_dim INTEGER,
+    title TEXT,
+    notification_number TEXT,
+    body_offset INTEGER,
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 -- 4. Create vector similarity search function
+--    (dropped first because CREATE OR REPLACE cannot change the return type)
+DROP FUNCTION IF EXISTS match_documents(vector, int);
 CREATE OR REPLACE FUNCTION match_documents(
     query_embedding vector(768),
     match_count int DEFAULT 10
 )
 RETURNS TABLE (
     id uuid,
-    content text,
     document_id text,
     section_number text,
     page_numbers int[],
+    tokens int,
+    title text,
+    notification_number text,
+    body text,
     similarity float
 )
 LANGUAGE plpgsql
@@ -60,10 +72,14 @@ BEGIN
     RETURN QUERY
     SELECT
         dc.id,
-        dc.content,
         dc.document_id,
         dc.section_number,
         dc.page_numbers,
+        dc.tokens,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
         1 - (dc.embedding <=> query_embedding) AS similarity
     FROM document_chunks dc
     ORDER BY dc.embedding <=> query_embedding
@@ -71,6 +87,122 @@ BEGIN
 END;
 $$;
 
--- 5. Create index for faster vector search (IVFFlat)
+-- 5. Create index for faster vector search (HNSW or IVFFlat)
 -- NOTE: Run this AFTER uploading data. IVFFlat needs existing rows to build.
+--    scripts/vector_index.py builds either kind, measures recall against exact
+--    search and pins ef_search / probes on the match_documents functions.
 -- CREATE INDEX ON document_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 50);
+
+-- 6. Corpus version, bumped on every write to document_chunks.
+--    The API polls it to invalidate its answer cache.
+CREATE TABLE IF NOT EXISTS corpus_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+INSERT INTO corpus_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_corpus_version()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE corpus_version SET version = version + 1, updated_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS document_chunks_bump_version ON document_chunks;
+CREATE TRIGGER document_chunks_bump_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON document_chunks
+FOR EACH STATEMENT EXECUTE FUNCTION bump_corpus_version();
+
+-- 7. Hybrid retrieval: full-text index plus match_documents_hybrid, which
+--    fuses vector and full-text rankings with reciprocal rank fusion
+--    (see add_hybrid_search.sql).
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+    ON document_chunks USING gin (content_tsv);
+
+DROP FUNCTION IF EXISTS match_documents_hybrid(vector, text, int, int, int);
+CREATE OR REPLACE FUNCTION match_documents_hybrid(
+    query_embedding vector(768),
+    query_text text,
+    match_count int DEFAULT 10,
+    candidate_count int DEFAULT 50,
+    rrf_k int DEFAULT 60
+)
+RETURNS TABLE (
+    id uuid,
+    document_id text,
+    section_number text,
+    page_numbers int[],
+    tokens int,
+    title text,
+    notification_number text,
+    body text,
+    similarity float,
+    rrf_score float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH text_query AS (
+        -- plainto_tsquery: question text is never read as operators ("16/2017 - Central Tax"
+        -- must not become NOT 'central'), so its only operator is &, turned into |
+        SELECT replace(plainto_tsquery('english', query_text)::text, ' & ', ' | ')::tsquery AS q
+    ),
+    vector_hits AS (
+        SELECT v.id, row_number() OVER (ORDER BY v.distance) AS rank
+        FROM (
+            SELECT dc.id, dc.embedding <=> query_embedding AS distance
+            FROM document_chunks dc
+            ORDER BY dc.embedding <=> query_embedding
+            LIMIT candidate_count
+        ) v
+    ),
+    text_hits AS (
+        SELECT t.id, row_number() OVER (ORDER BY t.text_rank DESC) AS rank
+        FROM (
+            SELECT dc.id, ts_rank_cd(dc.content_tsv, tq.q) AS text_rank
+            FROM document_chunks dc, text_query tq
+            WHERE dc.content_tsv @@ tq.q
+            ORDER BY ts_rank_cd(dc.content_tsv, tq.q) DESC
+            LIMIT candidate_count
+        ) t
+    ),
+    fused AS (
+        SELECT COALESCE(vh.id, th.id) AS chunk_id,
+               COALESCE(1.0 / (rrf_k + vh.rank), 0) + COALESCE(1.0 / (rrf_k + th.rank), 0) AS score
+        FROM vector_hits vh
+        FULL OUTER JOIN text_hits th ON th.id = vh.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.section_number,
+        dc.page_numbers,
+        dc.tokens,
+        dc.title,
+        dc.notification_number,
+        CASE WHEN dc.body_offset IS NULL THEN dc.content
+             ELSE substr(dc.content, dc.body_offset + 1) END AS body,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::float AS rrf_score
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.chunk_id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+END;
+$$;
+
+-- 8. Btree indexes for identifier lookups (notification / section), which
+--    the API resolves without embedding the question (see add_lookup_indexes.sql).
+CREATE INDEX IF NOT EXISTS documents_notification_number_idx
+    ON documents (notification_number text_pattern_ops);
+
+-- Chunks of a document in reading order, and chunks by section number.
+CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx
+    ON document_chunks (document_id, chunk_index);
+CREATE INDEX IF NOT EXISTS document_chunks_section_number_idx
+    ON document_chunks (section_number);
@@ -14,11 +14,13 @@ Requires DATABASE_URL in backend/.env
 import os
 import csv
 import json
-import ast
-import psycopg2
+import psycopg
 from dotenv import load_dotenv
 from tqdm import tqdm
 
+from backup_formats import parse_pg_array, parse_embedding
+from bulk_load import replace_chunks
+
 load_dotenv("backend/.env")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -27,43 +29,6 @@ if not DATABASE_URL:
     exit(1)
 
 
-def parse_pg_array(val: str) -> list:
-    """Parse a PostgreSQL array literal like {1,2,3} or JSON [1,2,3] into a Python list."""
-    if not val or val.strip() in ("", "{}", "[]"):
-        return []
-    val = val.strip()
-    # Try JSON first (handles [1, 2, 3])
-    try:
-        parsed = json.loads(val)
-        if isinstance(parsed, list):
-            return [int(x) for x in parsed]
-    except (json.JSONDecodeError, ValueError):
-        pass
-    # Fallback: PostgreSQL array format {1,2,3}
-    val = val.strip("{}")
-    if not val:
-        return []
-    return [int(x) for x in val.split(",")]
-
-
-def parse_embedding(val: str) -> list:
-    """Parse embedding string — could be JSON array or PostgreSQL vector literal."""
-    if not val or val.strip() == "":
-        return None
-    val = val.strip()
-    # Handle PostgreSQL vector format: [0.1,0.2,...] or JSON array
-    try:
-        return json.loads(val)
-    except json.JSONDecodeError:
-        pass
-    # Try ast.literal_eval as fallback
-    try:
-        return ast.literal_eval(val)
-    except (ValueError, SyntaxError):
-        pass
-    return None
-
-
 def upload_documents(conn, csv_path: str):
     """Upload documents_backup.csv to the documents table."""
     if not os.path.exists(csv_path):
@@ -126,71 +91,55 @@ def upload_documents(conn, csv_path: str):
     print(f"  OK - Inserted {inserted} documents")
 
 
+def read_chunk_rows(csv_path: str, stats: dict):
+    """Stream typed chunk rows from the CSV, skipping rows without an embedding."""
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            embedding = parse_embedding(row.get("embedding", ""))
+            if embedding is None:
+                stats["skipped"] += 1
+                continue
+
+            yield {
+                "id": row["id"],
+                "document_id": row.get("document_id"),
+                "chunk_index": int(row["chunk_index"]) if row.get("chunk_index") else None,
+                "total_chunks": int(row["total_chunks"]) if row.get("total_chunks") else None,
+                "section_number": row.get("section_number"),
+                "content": row.get("content"),
+                "embedding": embedding,
+                "tokens": int(row["tokens"]) if row.get("tokens") else None,
+                "page_numbers": parse_pg_array(row.get("page_numbers", "")),
+                "embed_model": row.get("embed_model") or None,
+                "embed_dim": int(row["embed_dim"]) if row.get("embed_dim") else None,
+                "created_at": row.get("created_at") or None,
+            }
+
+
 def upload_chunks(conn, csv_path: str):
-    """Upload document_chunks_backup.csv to the document_chunks table."""
+    """Bulk-load document_chunks_backup.csv into the document_chunks table.
+
+    Rows stream from the CSV straight into COPY and replace the live table
+    atomically (see bulk_load.py).
+    """
     if not os.path.exists(csv_path):
         print(f"Error: {csv_path} not found!")
         exit(1)
 
     print(f"\n[CHUNKS] Uploading chunks from {csv_path}...")
 
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    stats = {"skipped": 0}
+    with tqdm(desc="  Chunks", unit=" rows") as progress:
+        result = replace_chunks(conn, read_chunk_rows(csv_path, stats), progress=progress)
 
-    if not rows:
+    if not result["rows"]:
         print("  No rows found.")
         return
 
-    cur = conn.cursor()
-
-    # Clear existing data
-    cur.execute("DELETE FROM document_chunks")
-    conn.commit()
-
-    BATCH_SIZE = 100
-    inserted = 0
-    skipped = 0
-
-    for i in tqdm(range(0, len(rows), BATCH_SIZE), desc="  Chunks"):
-        batch = rows[i : i + BATCH_SIZE]
-
-        for row in batch:
-            embedding = parse_embedding(row.get("embedding", ""))
-            page_numbers = parse_pg_array(row.get("page_numbers", ""))
-
-            chunk_index = int(row["chunk_index"]) if row.get("chunk_index") else None
-            total_chunks = int(row["total_chunks"]) if row.get("total_chunks") else None
-            tokens = int(row["tokens"]) if row.get("tokens") else None
-
-            if embedding is None:
-                skipped += 1
-                continue
-
-            cur.execute(
-                """INSERT INTO document_chunks
-                   (id, document_id, chunk_index, total_chunks, section_number,
-                    content, embedding, tokens, page_numbers, created_at)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s::vector, %s, %s, %s)""",
-                (
-                    row["id"],
-                    row.get("document_id"),
-                    chunk_index,
-                    total_chunks,
-                    row.get("section_number"),
-                    row.get("content"),
-                    str(embedding),
-                    tokens,
-                    page_numbers,
-                    row.get("created_at"),
-                ),
-            )
-            inserted += 1
-
-        conn.commit()
-
-    cur.close()
-    print(f"  OK - Inserted {inserted} chunks ({skipped} skipped - no embedding)")
+    print(
+        f"  OK - Inserted {result['rows']} chunks ({stats['skipped']} skipped - no embedding) "
+        f"in {result['total_seconds']}s, {result['rows_per_sec']} rows/sec"
+    )
 
 
 def verify(conn):
@@ -209,7 +158,7 @@ def verify(conn):
 
 def main():
     print("Connecting to Neon PostgreSQL...")
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = psycopg.connect(DATABASE_URL)
     print("Connected!\n")
 
     upload_documents(conn, "documents_backup.csv")
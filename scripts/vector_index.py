@@ -0,0 +1,310 @@
+"""
+Build and tune the ANN index behind match_documents.
+
+Without an index, match_documents is an exact sequential scan, whose cost
+grows with every chunk. This script builds an HNSW or IVFFlat index on
+document_chunks.embedding (cosine, matching the <=> operator the functions
+use) and then tunes its search breadth. For each ef_search (HNSW) or probes
+(IVFFlat) value it measures recall@k against exact search and the query
+latency. The chosen value is pinned on match_documents and
+match_documents_hybrid with ALTER FUNCTION ... SET, so every search the API
+runs uses it.
+
+Tune with real questions embedded with Gemini (--questions, one per line)
+where possible. Without them the queries are the embeddings of sampled
+chunks, and each chunk's own row is left out of both result lists (it would
+otherwise be a guaranteed hit and inflate recall). Exact results come from
+the same query with index scans disabled.
+
+An HNSW scan returns at most ef_search rows, so ef_search is never pinned
+below MIN_EF_SEARCH: /query asks match_documents for up to 20 chunks and
+hybrid retrieval asks for HYBRID_CANDIDATES vector candidates.
+
+Usage:
+    python scripts/vector_index.py status
+    python scripts/vector_index.py build --method hnsw --m 16 --ef-construction 64
+    python scripts/vector_index.py build --method ivfflat --lists 100 --replace
+    python scripts/vector_index.py tune --k 10 --sample 200 --values 10,20,40,80,160
+    python scripts/vector_index.py tune --questions questions.txt --target-recall 0.95
+    python scripts/vector_index.py apply --ef-search 40
+    python scripts/vector_index.py apply --reset
+"""
+
+import os
+import time
+import random
+import argparse
+import psycopg
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv("backend/.env")
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL not set in backend/.env")
+    exit(1)
+
+# Search functions whose plans use the embedding index, by signature
+SEARCH_FUNCTIONS = ("match_documents(vector, int)", "match_documents_hybrid(vector, text, int, int, int)")
+# Search-breadth setting of each index method
+SEARCH_SETTINGS = {"hnsw": "hnsw.ef_search", "ivfflat": "ivfflat.probes"}
+DEFAULT_VALUES = {"hnsw": "50,80,120,160,240,320", "ivfflat": "1,2,4,8,16,32"}
+# Largest row count the API asks of the search functions (k <= 20 per /query)
+MIN_EF_SEARCH = max(20, int(os.getenv("HYBRID_CANDIDATES", 50)))
+
+ANN_INDEXES_SQL = """SELECT i.relname AS name, am.amname AS method,
+       pg_size_pretty(pg_relation_size(i.oid)) AS size, pg_get_indexdef(i.oid) AS definition
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+JOIN pg_am am ON am.oid = i.relam
+WHERE x.indrelid = 'document_chunks'::regclass AND am.amname IN ('hnsw', 'ivfflat')"""
+KNN_SQL = "SELECT id FROM document_chunks ORDER BY embedding <=> %s::vector LIMIT %s"
+
+
+def ann_indexes(cur) -> list[tuple]:
+    cur.execute(ANN_INDEXES_SQL)
+    return cur.fetchall()
+
+
+def function_settings(cur) -> dict:
+    """Per-function configuration set with ALTER FUNCTION ... SET."""
+    settings = {}
+    for signature in SEARCH_FUNCTIONS:
+        cur.execute("SELECT proconfig FROM pg_proc WHERE oid = to_regprocedure(%s)", (signature,))
+        row = cur.fetchone()
+        settings[signature] = (row[0] or []) if row else None
+    return settings
+
+
+# ──────────────────────────────────────────────────────────────
+# status / build / apply
+# ──────────────────────────────────────────────────────────────
+
+def status(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL")
+        print(f"Chunks with embeddings: {cur.fetchone()[0]}")
+
+        indexes = ann_indexes(cur)
+        if not indexes:
+            print("ANN indexes: none (match_documents runs a sequential scan)")
+        for name, method, size, definition in indexes:
+            print(f"ANN index: {name} ({method}, {size})\n  {definition}")
+
+        for signature, config in function_settings(cur).items():
+            if config is None:
+                print(f"{signature}: not found")
+            else:
+                print(f"{signature}: {', '.join(config) or 'no settings'}")
+
+
+def build(conn, args):
+    with conn.cursor() as cur:
+        existing = ann_indexes(cur)
+        if existing and not args.replace:
+            names = ", ".join(name for name, *_ in existing)
+            print(f"Error: document_chunks already has an ANN index ({names}); pass --replace to rebuild")
+            exit(1)
+
+        if args.method == "hnsw":
+            options = f"m = {args.m}, ef_construction = {args.ef_construction}"
+        else:
+            lists = args.lists
+            if lists is None:
+                # pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+                cur.execute("SELECT COUNT(*) FROM document_chunks WHERE embedding IS NOT NULL")
+                rows = cur.fetchone()[0]
+                lists = max(1, rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5))
+            options = f"lists = {lists}"
+
+        for name, *_ in existing:
+            print(f"Dropping {name}...")
+            cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+        name = f"document_chunks_embedding_{args.method}_idx"
+        print(f"Building {name} WITH ({options})...", flush=True)
+        start = time.perf_counter()
+        cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (args.maintenance_work_mem,))
+        cur.execute(
+            f"CREATE INDEX CONCURRENTLY {name} ON document_chunks "
+            f"USING {args.method} (embedding vector_cosine_ops) WITH ({options})"
+        )
+        cur.execute("ANALYZE document_chunks")
+        print(f"Built in {time.perf_counter() - start:.1f}s")
+
+
+def apply(conn, method: str | None, value: int | None):
+    """Pin the search breadth on the search functions (value None: remove it)."""
+    if method == "hnsw" and value is not None and value < MIN_EF_SEARCH:
+        print(f"hnsw.ef_search {value} would cap searches at {value} rows; using {MIN_EF_SEARCH} instead")
+        value = MIN_EF_SEARCH
+    with conn.transaction(), conn.cursor() as cur:
+        for signature in SEARCH_FUNCTIONS:
+            cur.execute("SELECT to_regprocedure(%s)", (signature,))
+            if cur.fetchone()[0] is None:
+                print(f"Skipping {signature}: not found")
+                continue
+            for index_method, setting in SEARCH_SETTINGS.items():
+                if index_method == method and value is not None:
+                    cur.execute(f"ALTER FUNCTION {signature} SET {setting} = {int(value)}")
+                    print(f"{signature}: SET {setting} = {int(value)}")
+                else:
+                    cur.execute(f"ALTER FUNCTION {signature} RESET {setting}")
+
+
+# ──────────────────────────────────────────────────────────────
+# tune
+# ──────────────────────────────────────────────────────────────
+
+def sample_chunk_queries(cur, sample: int) -> list[tuple]:
+    """(chunk id, embedding) of `sample` random chunks; the id is excluded from its own results."""
+    cur.execute(
+        "SELECT id, embedding::text FROM document_chunks WHERE embedding IS NOT NULL ORDER BY random() LIMIT %s",
+        (sample,),
+    )
+    return cur.fetchall()
+
+
+def embed_questions(path: str, sample: int) -> list[tuple]:
+    """Embed up to `sample` questions from `path` the way the API embeds them."""
+    from google import genai
+
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    if len(questions) > sample:
+        questions = random.sample(questions, sample)
+
+    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    vectors = []
+    for start in range(0, len(questions), 100):
+        result = client.models.embed_content(
+            model="gemini-embedding-001",
+            contents=questions[start : start + 100],
+            config={"output_dimensionality": 768},
+        )
+        vectors.extend(e.values for e in result.embeddings)
+    print(f"Embedded {len(vectors)} questions from {path}")
+    return [(None, "[" + ",".join(repr(float(x)) for x in vector) + "]") for vector in vectors]
+
+
+def run_queries(conn, queries: list[tuple], k: int, settings: list[str]) -> tuple[list[list], list[float]]:
+    """Run every (exclude_id, vector) query under `settings` (SET LOCAL statements).
+
+    Returns the k nearest ids per query, without exclude_id, and latencies (ms).
+    """
+    results, latencies = [], []
+    with conn.transaction():
+        with conn.cursor() as cur:
+            for statement in settings:
+                cur.execute(statement)
+            cur.execute(KNN_SQL, (queries[0][1], k))  # warm the plan and the cache
+            for exclude_id, vector in queries:
+                start = time.perf_counter()
+                cur.execute(KNN_SQL, (vector, k + 1 if exclude_id is not None else k))
+                ids = [row[0] for row in cur.fetchall()]
+                latencies.append((time.perf_counter() - start) * 1000)
+                results.append([i for i in ids if i != exclude_id][:k])
+    return results, latencies
+
+
+def tune(conn, args):
+    with conn.cursor() as cur:
+        indexes = ann_indexes(cur)
+        if not indexes:
+            print("Error: no ANN index on document_chunks.embedding; run `build` first")
+            exit(1)
+        method = indexes[0][1]
+        queries = (
+            embed_questions(args.questions, args.sample) if args.questions else sample_chunk_queries(cur, args.sample)
+        )
+    if not queries:
+        print("Error: no queries to tune with")
+        exit(1)
+
+    setting = SEARCH_SETTINGS[method]
+    values = [int(v) for v in (args.values or DEFAULT_VALUES[method]).split(",")]
+    if method == "hnsw":
+        skipped = [v for v in values if v < MIN_EF_SEARCH]
+        values = [v for v in values if v >= MIN_EF_SEARCH]
+        if skipped:
+            print(f"Skipping ef_search {', '.join(map(str, skipped))}: below MIN_EF_SEARCH={MIN_EF_SEARCH}")
+        if not values:
+            print("Error: no ef_search values to try")
+            exit(1)
+    if not args.questions:
+        print("No --questions file: tuning with sampled chunk embeddings (own row excluded)")
+    print(f"Tuning {setting} on {indexes[0][0]} with {len(queries)} queries, k={args.k}", flush=True)
+
+    exact, exact_latency = run_queries(conn, queries, args.k, ["SET LOCAL enable_indexscan = off"])
+    print("-" * 60)
+    print(f"{setting:<18}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    p50, p95 = np.percentile(exact_latency, [50, 95])
+    print(f"{'exact (seq scan)':<18}{1.0:>10.3f}{p50:>10.1f}{p95:>10.1f}{np.mean(exact_latency):>10.1f}")
+
+    curve = []
+    for value in values:
+        found, latency = run_queries(conn, queries, args.k, [f"SET LOCAL {setting} = {value}"])
+        recall = np.mean([
+            len(set(ids) & set(truth)) / len(truth) for ids, truth in zip(found, exact) if truth
+        ])
+        p50, p95 = np.percentile(latency, [50, 95])
+        curve.append((value, recall))
+        print(f"{value:<18}{recall:>10.3f}{p50:>10.1f}{p95:>10.1f}{np.mean(latency):>10.1f}", flush=True)
+    print("-" * 60)
+
+    if args.target_recall is not None:
+        chosen = next((value for value, recall in curve if recall >= args.target_recall), None)
+        if chosen is None:
+            print(f"No {setting} value reached recall {args.target_recall}; nothing applied")
+            return
+        print(f"Smallest {setting} reaching recall {args.target_recall}: {chosen}")
+        apply(conn, method, chosen)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="Show ANN indexes and the search functions' settings")
+
+    build_parser = commands.add_parser("build", help="Create the ANN index on document_chunks.embedding")
+    build_parser.add_argument("--method", choices=("hnsw", "ivfflat"), default="hnsw")
+    build_parser.add_argument("--m", type=int, default=16, help="HNSW: links per node")
+    build_parser.add_argument("--ef-construction", type=int, default=64, help="HNSW: candidate list size while building")
+    build_parser.add_argument("--lists", type=int, help="IVFFlat: number of lists (default: from the row count)")
+    build_parser.add_argument("--maintenance-work-mem", default="512MB", help="Memory for the build")
+    build_parser.add_argument("--replace", action="store_true", help="Drop existing ANN indexes first")
+
+    tune_parser = commands.add_parser("tune", help="Measure recall and latency across ef_search / probes")
+    tune_parser.add_argument("--k", type=int, default=10, help="Neighbours per query (recall@k)")
+    tune_parser.add_argument("--sample", type=int, default=100, help="Number of queries")
+    tune_parser.add_argument("--questions", help="File of real questions, one per line (embedded with Gemini)")
+    tune_parser.add_argument("--values", help="Comma-separated ef_search / probes values to try")
+    tune_parser.add_argument("--target-recall", type=float, help="Apply the smallest value reaching this recall")
+
+    apply_parser = commands.add_parser("apply", help="Pin ef_search / probes on the search functions")
+    group = apply_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--ef-search", type=int, help="hnsw.ef_search for HNSW indexes")
+    group.add_argument("--probes", type=int, help="ivfflat.probes for IVFFlat indexes")
+    group.add_argument("--reset", action="store_true", help="Remove both settings")
+
+    args = parser.parse_args()
+
+    # autocommit: CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    conn = psycopg.connect(DATABASE_URL, autocommit=True)
+    try:
+        if args.command == "status":
+            status(conn)
+        elif args.command == "build":
+            build(conn, args)
+        elif args.command == "tune":
+            tune(conn, args)
+        elif args.reset:
+            apply(conn, None, None)
+        elif args.ef_search is not None:
+            apply(conn, "hnsw", args.ef_search)
+        else:
+            apply(conn, "ivfflat", args.probes)
+    finally:
+        conn.close()